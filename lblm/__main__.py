@@ -1,27 +1,112 @@
-from .brain import Brain
-from .detector import Detector
-from .visualizer import Visualizer
+import time
+START_TIME = time.time()
+
+import atexit
 import click
+from multiprocessing import Event
+
+from . import log
+from .startup import begin, mark, stage
+
+# the components are imported where they are used, so every process only loads the libraries it needs:
+# llama_cpp in the Brain thread, mediapipe in the Detector process and Panda3D in the Visualizer process
 
 @click.command()
 @click.option('--light',is_flag=True, default=False, help="If the visualisation should run in light mode")
 @click.option('--loop',is_flag=True, default=False, help="If the visualiser should only loop through the animations")
-def main(light:bool,loop:bool):
+@click.option('--record', type=click.Path(dir_okay=False), default=None, help="Record the landmark stream of the detector to this file")
+@click.option('--replay', type=click.Path(exists=True, dir_okay=False), default=None, help="Replay a landmark recording instead of using the camera")
+@click.option('--replay-speed', type=float, default=1.0, show_default=True, help="Speed of the replay relative to real time, 0 for as fast as possible")
+@click.option('--gate-threshold', type=float, default=0.35, show_default=True, help="Mean angle change in radians a pose needs to trigger a new response, negative to respond to every pose")
+@click.option('--target-fps', type=float, default=25, show_default=True, help="Frame rate the detection quality adapts to, 0 for a fixed quality")
+@click.option('--full-frame', is_flag=True, default=False, help="Always process the full camera frame instead of the region around the body")
+@click.option('--persons', type=click.IntRange(min=1), default=1, show_default=True, help="Maximum number of persons tracked at once, each gets its own responses")
+@click.option('--videos', type=click.Path(exists=True, file_okay=False), default=None, help="Play the pre-rendered animation videos in this folder instead of rendering the character")
+@click.option('--cpu-skinning', is_flag=True, default=False, help="Animate the character on the CPU instead of skinning it in the vertex shader")
+@click.option('--fps', type=float, default=30, show_default=True, help="Frame rate cap of the visualisation, 0 for uncapped")
+@click.option('--fixed-resolution', is_flag=True, default=False, help="Always render at the full window resolution instead of adapting it to hold the frame rate")
+@click.option('--multisample', is_flag=True, default=False, help="Open the window with 4x multisampling, it is used when the frame rate leaves room for it")
+@click.option('--avatars', type=click.IntRange(min=1), default=1, show_default=True, help="Number of avatars, with several persons every person is answered by its own avatar")
+@click.option('--offscreen', is_flag=True, default=False, help="Render without a window, use with --stream")
+@click.option('--stream', multiple=True, help="Stream the rendered frames to shm:<name>, http://<host>:<port> (MJPEG) or a video file, can be repeated")
+@click.option('--send', default=None, help="Only run the detector and send the landmarks to the Brain at host:port")
+@click.option('--listen', default=None, help="Receive the landmarks of remote detectors on [host:]port instead of using the camera")
+@click.option('--server', default=None, help="Use the shared inference server at this url instead of a local language model")
+@click.option('--segment-gestures', is_flag=True, default=False, help="Respond at the end of every gesture instead of every 6 seconds")
+@click.option('--no-smoothing', is_flag=True, default=False, help="Use the raw landmarks of the model instead of smoothing them over time")
+@click.option('--idle-after', type=float, default=10, show_default=True, help="Seconds without a visible person until the detection and rendering rates are lowered, 0 to always run at full rate")
+@click.option('--sleep-after', type=float, default=300, show_default=True, help="Seconds without a visible person until the language model is unloaded as well")
+@click.option('--startup-report', is_flag=True, default=False, help="Print how long the imports and startup stages of every process take")
+@click.option('--profile', type=click.Path(file_okay=False), default=None, help="Profile the Detector, the Brain and the Visualizer and write flame graph stacks to this folder, also on SIGUSR1")
+@click.option('--log-level', type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False), default="INFO", show_default=True, help="Minimum level of the log messages")
+@click.option('--log-file', type=click.Path(dir_okay=False), default=None, help="Also write the log messages to this file as JSON lines")
+def main(light:bool,loop:bool,record:str|None,replay:str|None,replay_speed:float,gate_threshold:float,target_fps:float,full_frame:bool,persons:int,videos:str|None,cpu_skinning:bool,fps:float,fixed_resolution:bool,multisample:bool,avatars:int,offscreen:bool,stream:tuple[str, ...],send:str|None,listen:str|None,server:str|None,segment_gestures:bool,no_smoothing:bool,idle_after:float,sleep_after:float,startup_report:bool,profile:str|None,log_level:str,log_file:str|None):
     """
     Main entry point for the LBLM application
     """
-    brain = Brain()
+    if startup_report:
+        begin(START_TIME)
+    # a background thread writes the log messages of all processes
+    atexit.register(log.start(level=log_level.upper(), jsonl_path=log_file).stop)
+    with stage("main", "import components"):
+        from .power import PowerStateMachine
+        from .profiling import install_signal_handler
+        from .transport import LandmarkReceiver, LandmarkSender, parse_address
+
+    # the camera drives the power state, replays and remote detectors keep everything at full rate
+    power = PowerStateMachine(idle_after=idle_after, sleep_after=max(sleep_after, idle_after)) if idle_after > 0 and not (replay or listen or loop) else None
+
+    if profile:
+        # the Brain thread is profiled in this process, its signal handler has to be installed by the main thread
+        install_signal_handler()
 
-    vis = Visualizer(options=brain.options, queue=brain.output_queue, is_outputting_event=brain.is_outputting_event, light=light,loop=loop)
+    if send:
+        # camera node, the Brain and the Visualizer run on another machine
+        with stage("main", "import detector"):
+            from .detector import Detector
+            from .recorder import LandmarkReplayer
+        sender = LandmarkSender(*parse_address(send, default_host="127.0.0.1"))
+        if replay:
+            detector = LandmarkReplayer(replay, data_queue=sender, stop_event=Event(), speed=replay_speed, segment_gestures=segment_gestures)
+        else:
+            detector = Detector(data_queue=sender, stop_event=Event(), record_path=record, target_fps=target_fps or None, track_roi=not full_frame, segment_gestures=segment_gestures, smooth=not no_smoothing, power=power, profile_dir=profile)
+        detector.start()
+        detector.join()
+        return
 
-    if not loop:
-        detector = Detector(data_queue=brain.input_queue, stop_event=brain.stop_event)
+    receiver = LandmarkReceiver(*parse_address(listen)) if listen else None
+    with stage("main", "import brain and visualizer"):
+        from .brain import Brain
+        from .gating import PoseGate
+        from .visualizer import Visualizer
+    gate = PoseGate(threshold=gate_threshold) if gate_threshold >= 0 else None
+    if server:
+        from .server import RemoteBrain
+        brain = RemoteBrain(server, gate=gate, tag_persons=avatars > 1, input_queue=receiver, power=power, profile_dir=profile)
     else:
+        brain = Brain(gate=gate, tag_persons=avatars > 1, input_queue=receiver, power=power, profile_dir=profile)
+
+    vis = Visualizer(catalog=brain.catalog, queue=brain.output_queue, is_outputting_event=brain.is_outputting_event, light=light,loop=loop, video_path=videos, hardware_skinning=not cpu_skinning, fps=fps, adaptive_resolution=not fixed_resolution, multisample=multisample, avatars=avatars, offscreen=offscreen, streams=stream, power=power, profile_dir=profile)
+
+    if loop or receiver:
         detector = None
+    elif replay:
+        with stage("main", "import detector"):
+            from .recorder import LandmarkReplayer
+        detector = LandmarkReplayer(replay, data_queue=brain.input_queue, stop_event=brain.stop_event, speed=replay_speed, segment_gestures=segment_gestures)
+    elif persons > 1:
+        with stage("main", "import detector"):
+            from .multi_person import MultiPersonDetector
+        detector = MultiPersonDetector(data_queue=brain.input_queue, stop_event=brain.stop_event, num_poses=persons, record_path=record, target_fps=target_fps or None, segment_gestures=segment_gestures, smooth=not no_smoothing, power=power, profile_dir=profile)
+    else:
+        with stage("main", "import detector"):
+            from .detector import Detector
+        detector = Detector(data_queue=brain.input_queue, stop_event=brain.stop_event, record_path=record, target_fps=target_fps or None, track_roi=not full_frame, segment_gestures=segment_gestures, smooth=not no_smoothing, power=power, profile_dir=profile)
     brain.start()
     vis.start()
     if detector:
         detector.start()
+    mark("main", "components started")
     brain.join()
     if detector:
         detector.join()
@@ -29,4 +114,4 @@ def main(light:bool,loop:bool):
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,69 @@
+import copy
+
+import numpy as np
+
+from .detection import BodyModel
+
+
+class ChunkAggregator:
+    """
+    Averages a stream of landmark frames over fixed windows.
+    The window is measured on the frame timestamps, so recorded streams replayed at any speed produce the same chunks
+    as the live detector did.
+    """
+
+    def __init__(self, chunk_length: float = 6):
+        """
+        :param chunk_length: The length of one chunk in seconds.
+        """
+        self.chunk_length = chunk_length
+        self.start = 0.0
+        self.amount = 0
+        self.chunk = None
+        self.reset()
+
+    def reset(self):
+        self.start = 0.0
+        self.amount = 0
+        self.chunk = None
+
+    def flush(self, timestamp: float, person_id: int = 0) -> list:
+        """
+        Ends the stream of a visitor that is gone for good, e.g. a track that was lost or the end of a replay.
+        :return: The empty detection of the departure, the incomplete chunk is dropped.
+        """
+        self.reset()
+        return [BodyModel(timestamp=timestamp, person_id=person_id)]
+
+    def update(self, body_data):
+        """
+        Adds a frame to the current chunk.
+        :param body_data: The detected body of the current frame.
+        :return: The averaged chunk if the window is complete, otherwise None.
+        """
+        if self.chunk is None:
+            # own the chunk, the frame might be reused by the caller
+            self.chunk = copy.copy(body_data)
+            self.chunk.landmarks = np.array(body_data.landmarks, dtype=np.float32, copy=True)
+            if body_data.kinematics is not None:
+                self.chunk.kinematics = np.array(body_data.kinematics, dtype=np.float32, copy=True)
+            self.start = body_data.timestamp
+            self.amount = 1
+            return None
+
+        if body_data.timestamp - self.start > self.chunk_length:
+            chunk = self.chunk
+            chunk.landmarks *= 1 / self.amount  # Average landmarks
+            if chunk.kinematics is not None:
+                chunk.kinematics *= 1 / self.amount
+            self.reset()
+            return chunk
+
+        self.chunk.landmarks += body_data.landmarks
+        if self.chunk.kinematics is not None:
+            if body_data.kinematics is not None:
+                self.chunk.kinematics += body_data.kinematics
+            else:
+                self.chunk.kinematics = None  # only averaged over complete streams
+        self.amount += 1
+        return None
@@ -1,5 +1,9 @@
 import os
 
+from .log import get_logger
+
+logger = get_logger(__name__)
+
 def load_animations(animations_path="data/animations") -> dict[str,str]:
     """
     Loads all .gbl animations from the specified path.
@@ -23,5 +27,5 @@ def load_animations(animations_path="data/animations") -> dict[str,str]:
     else:
         raise ValueError("No idle animation found in options. Please provide an idle animation.")
 
-    print("loaded: ", animations.keys())
+    logger.debug("Loaded %d animations", len(animations))
     return animations
\ No newline at end of file
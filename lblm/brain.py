@@ -1,11 +1,23 @@
-import os
+import copy
+import queue
 import threading
+from collections import OrderedDict
 from multiprocessing import Queue, Event
+from typing import TYPE_CHECKING
 import numpy as np
-from llama_cpp import Llama, ChatCompletionRequestSystemMessage, ChatCompletionRequestUserMessage
 
-from .animations import load_animations
 from .body_model import BodyModel
+from .catalog import AnimationCatalog
+from .gating import PoseGate
+from .log import get_logger
+from .power import PowerState, PowerStateMachine
+from .profiling import Profiler
+from .startup import stage
+
+if TYPE_CHECKING:
+    from llama_cpp import Llama
+
+logger = get_logger(__name__)
 
 PROMPT = \
     """
@@ -16,11 +28,55 @@ PROMPT = \
     """
 
 
+def load_llm() -> "Llama":
+    """Loads the language model, it is downloaded and cached on the first call"""
+    with stage("brain", "import llama_cpp"):
+        from llama_cpp import Llama
+    with stage("brain", "load language model"):
+        return Llama.from_pretrained(
+            repo_id="bartowski/Llama-3.2-3B-Instruct-GGUF",
+            filename="Llama-3.2-3B-Instruct-Q8_0.gguf",
+            n_gpu_layers=-1,  # Use all layers on GPU
+        )
+
+
+def complete(llm: "Llama", gesture: str, options: str) -> str:
+    """
+    Asks the language model for a response to a gesture.
+    :param llm: The language model.
+    :param gesture: The name of the animation most similar to the gesture of the user.
+    :param options: The comma separated animation names to choose from.
+    :return: The raw response of the model.
+    """
+    from llama_cpp import ChatCompletionRequestSystemMessage
+
+    prompt: ChatCompletionRequestSystemMessage = {"role": "system", "content": PROMPT.format(options=options, user_gesture=gesture)}
+    response = llm.create_chat_completion(
+        top_p=0.95,
+        temperature=0.7,
+        max_tokens=50,
+        messages=[prompt]
+    )
+    return response["choices"][0]["message"]["content"]
+
+
 class Brain(threading.Thread):
-    def __init__(self):
+    def __init__(self, gate: PoseGate | None = None, tag_persons: bool = False, input_queue=None,
+                 power: PowerStateMachine | None = None, profile_dir: str | None = None):
+        """
+        :param gate: Filters the incoming poses, only poses that pass it are inferred. Every pose is inferred if None.
+            Each tracked person gets its own copy of the gate.
+        :param tag_persons: If the responses are put in the output queue as (person id, animation) pairs instead of
+            plain animation names, to answer every person with its own avatar.
+        :param input_queue: The source of the detections, a transport.LandmarkReceiver for a remote Detector. A local
+            queue is created if None.
+        :param power: The power state of the installation, the language model is unloaded while it sleeps and loaded
+            again as soon as somebody shows up. Stays loaded if None.
+        :param profile_dir: If given, the Brain thread is profiled and the profile is written to this folder.
+        """
         super().__init__()
         # communication queues
-        self.input_queue = Queue()
+        self.input_queue = input_queue if input_queue is not None else Queue()
         self.output_queue = Queue()
 
         # events
@@ -28,82 +84,111 @@ class Brain(threading.Thread):
         self.is_outputting_event = Event()
 
         # options
-        self.options = load_animations(animations_path="lblm/data/animations")
-        self.vectors = self.load_vectors()
+        with stage("main", "load animation catalog"):
+            self.catalog = AnimationCatalog.load()
+        self.options = self.catalog.animations
+        logger.info("Loaded %d animations", len(self.catalog))
+
+        self.gate = gate
+        self.gates: OrderedDict[int, PoseGate] = OrderedDict()
+        self.max_gates = 32
+        self.tag_persons = tag_persons
+
+        self.power = power
+        self.poll_interval = 0.25  # seconds between checks of the power state while no detection arrives
+        self.loaded = False
+
+        self.profiler = Profiler("brain", profile_dir) if profile_dir else None
+
+    def get_gate(self, person_id: int) -> PoseGate:
+        """Returns the gate of the person, the gates of the least recently seen persons are dropped"""
+        gate = self.gates.get(person_id)
+        if gate is None:
+            gate = copy.deepcopy(self.gate)
+            self.gates[person_id] = gate
+            if len(self.gates) > self.max_gates:
+                self.gates.popitem(last=False)
+        else:
+            self.gates.move_to_end(person_id)
+        return gate
 
     def find_most_similar_vector(self, query_vector, similarity='cosine'):
-        def cosine_similarity(a, b):
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-        best_key = None
-        best_score = -np.inf
-
-        for key, vec in self.vectors.items():
-            if similarity == 'cosine':
-                score = cosine_similarity(query_vector, vec)
-            elif similarity == 'dot':
-                score = np.dot(query_vector, vec)
-            else:
-                raise ValueError("Unsupported similarity metric")
-
-            if score > best_score:
-                best_score = score
-                best_key = key
-
-        return best_key
-
-    @staticmethod
-    def load_vectors(path="lblm/data/search_space"):
-        """
-        Loads all saved vectors from the saved vectors folder.
-        :return:
-        """
-        arrays = {}
-        for filename in os.listdir(path):
-            if filename.endswith('.npy'):
-                key = os.path.splitext(filename)[0]
-                full_path = os.path.join(path, filename)
-                array = np.load(full_path, allow_pickle=True)
-                arrays[key] = BodyModel(data=array).get_angle_vector()
-        print(f"Loaded {len(arrays.keys())} vectors")
-        print(arrays["idle"])
-        return arrays
+        """Returns the name of the animation whose search space vector is the most similar to the query vector"""
+        return self.catalog.names[self.catalog.most_similar(query_vector, similarity=similarity)]
+
+    def setup(self):
+        """Loads the language model, called when the thread starts"""
+        self.llm = load_llm()
+
+    def teardown(self):
+        """Unloads the language model to free its memory while the installation sleeps"""
+        self.llm.close()
+        self.llm = None
+
+    def update_power(self):
+        """Loads or unloads the language model to match the power state"""
+        sleeping = self.power is not None and self.power.state == PowerState.SLEEP
+        if sleeping and self.loaded:
+            self.teardown()
+            self.loaded = False
+            logger.info("Language model unloaded")
+        elif not sleeping and not self.loaded:
+            self.setup()
+            self.loaded = True
+            if self.profiler and getattr(self, "llm", None) is not None:
+                self.profiler.instrument(self.llm, "create_chat_completion")
+
+    def complete(self, gesture: str) -> str:
+        """Returns the raw response of the language model to the gesture"""
+        return complete(self.llm, gesture, self.catalog.prompt_options)
 
     def run(self):
+        if self.profiler:
+            self.profiler.instrument(self, "find_most_similar_vector")
+            self.profiler.instrument(BodyModel, "get_angle_vector")
+            self.profiler.start()
         try:
             self.is_outputting_event.set()
 
-            llm = Llama.from_pretrained(
-                repo_id="bartowski/Llama-3.2-3B-Instruct-GGUF",
-                filename="Llama-3.2-3B-Instruct-Q8_0.gguf",
-                n_gpu_layers=-1,  # Use all layers on GPU
-            )
+            self.update_power()
 
             while True:
-                value = self.input_queue.get()
-                print("Received input: ", value)
+                if self.power is None:
+                    value = self.input_queue.get()
+                else:
+                    try:
+                        value = self.input_queue.get(timeout=self.poll_interval)
+                    except queue.Empty:
+                        self.update_power()
+                        continue
+                    self.update_power()
+                logger.debug("Received input of person %d", value.person_id,
+                             extra={"person_id": value.person_id, "timestamp": value.timestamp})
                 array = value.landmarks
-                if np.any(array):
-                    vec = BodyModel(data=array).get_angle_vector()
-                    closest_match = self.find_most_similar_vector(vec, similarity='cosine')
-                    print(f"Closest match: {closest_match}")
-
-
-                    prompt:ChatCompletionRequestSystemMessage = {"role": "system", "content": PROMPT.format(options=", ".join(self.options), user_gesture=closest_match)}
-
-                    print("Starting Completion")
-                    response = llm.create_chat_completion(
-                        top_p=0.95,
-                        temperature=0.7,
-                        max_tokens=50,
-                        messages=[ prompt ]
-                    )
-
-                    result = response["choices"][0]["message"]["content"]
-                    print(f"LBLM Raw Response: {result}")
-                    words = [word.strip() for word in result.split(',') if word.strip() and word.strip() in self.options]
-                    print(f"LBLM Filtered Response: {words}")
-                    for word in words:
-                        self.output_queue.put(word)
-        except Exception as e:
-            print(f"Brain Freeze: {e}")
+                if not np.any(array):
+                    # nobody is there, the gate forgets the last pose so a returning visitor gets a response
+                    if self.gate is not None:
+                        self.get_gate(value.person_id).update_presence(array)
+                    continue
+                if not self.loaded:
+                    logger.info("Language model is unloaded, skipping inference")
+                    continue
+                vec = BodyModel(data=array).get_angle_vector()
+                if self.gate is not None and not self.get_gate(value.person_id).check(array, vec):
+                    logger.debug("Pose did not change, skipping inference", extra={"person_id": value.person_id})
+                    continue
+                closest_match = self.find_most_similar_vector(vec, similarity='cosine')
+                logger.info("Closest match: %s", closest_match,
+                            extra={"person_id": value.person_id, "gesture": closest_match})
+
+                result = self.complete(closest_match)
+                logger.debug("LBLM Raw Response: %s", result)
+                words = [word.strip() for word in result.split(',') if word.strip() and word.strip() in self.catalog.ids]
+                logger.info("LBLM Filtered Response: %s", words, extra={"person_id": value.person_id, "response": words})
+                for word in words:
+                    self.output_queue.put((value.person_id, word) if self.tag_persons else word)
+        except Exception:
+            logger.exception("Brain Freeze")
+        finally:
+            if self.profiler:
+                self.profiler.stop()
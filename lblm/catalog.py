@@ -0,0 +1,171 @@
+import hashlib
+import os
+
+import numpy as np
+
+from .body_model import BodyModel
+from .log import get_logger
+from .skeleton import load_clip, to_landmarks
+
+logger = get_logger(__name__)
+
+CATALOG_VERSION = 2
+
+# where the search space vector of an animation comes from
+DETECTED = "detected"  # detected by MediaPipe on the renders, the .npy of the search space
+SKELETON = "skeleton"  # sampled from the skeleton, calibrated to the detected vectors
+
+
+def directory_fingerprint(*paths: str, extensions=(".glb", ".npy")) -> str:
+    """A cheap fingerprint of the names, sizes and modification times of the files in the folders"""
+    digest = hashlib.sha1()
+    for path in paths:
+        if not path or not os.path.isdir(path):
+            continue
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            if entry.name.lower().endswith(extensions):
+                stat = entry.stat()
+                digest.update(f"{path}/{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+class AnimationCatalog:
+    """
+    All animations with their precomputed metadata, stored as compact arrays indexed by the animation id.
+    The idle animation always has the id 0. The catalog is built once and cached next to the animations folder, it is
+    rebuilt automatically when an animation or a search space vector is added or changed.
+    """
+
+    def __init__(self, names, paths, durations, frame_counts, bounds, tags, vectors, hashes, sources):
+        self.names: list[str] = list(names)
+        self.paths: list[str] = list(paths)
+        self.durations: np.ndarray = np.asarray(durations, dtype=np.float32)  # seconds
+        self.frame_counts: np.ndarray = np.asarray(frame_counts, dtype=np.int32)
+        self.bounds: np.ndarray = np.asarray(bounds, dtype=np.float32)  # (n, 2, 3) min and max joint position
+        self.tags: list[tuple[str, ...]] = [tuple(tag) for tag in tags]
+        self.vectors: np.ndarray = np.asarray(vectors, dtype=np.float32)  # (n, angles) search space angle vectors
+        self.hashes: list[str] = list(hashes)  # sha256 of the source .glb
+        self.sources: list[str] = list(sources)  # DETECTED or SKELETON, the origin of each vector
+
+        self.ids: dict[str, int] = {name: index for index, name in enumerate(self.names)}
+        # the animations in the format of Actor and load_animations
+        self.animations: dict[str, str] = dict(zip(self.names, self.paths))
+        # unit vectors for a cosine similarity as a single matrix product
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.unit_vectors = self.vectors / np.where(norms > 0, norms, 1)
+        # the option list of the prompt
+        self.prompt_options = ", ".join(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def most_similar(self, vector: np.ndarray, similarity='cosine') -> int:
+        """
+        :param vector: The angle vector of a pose.
+        :param similarity: The similarity metric, 'cosine' or 'dot'.
+        :return: The id of the animation most similar to the vector.
+        """
+        if similarity == 'cosine':
+            norm = np.linalg.norm(vector)
+            scores = self.unit_vectors @ (vector / norm if norm > 0 else vector)
+        elif similarity == 'dot':
+            scores = self.vectors @ vector
+        else:
+            raise ValueError("Unsupported similarity metric")
+        return int(np.argmax(scores))
+
+    @classmethod
+    def build(cls, animations_path="lblm/data/animations", search_space_path="lblm/data/search_space"):
+        """
+        Builds the catalog from the animation files.
+        The search space vector of an animation is taken from its .npy file in the search space folder. Animations
+        without one get a vector sampled from their skeleton, which is calibrated to the detected vectors but matches
+        less precisely. The source of every vector is recorded in the sources.
+        """
+        names = []
+        for file in os.listdir(animations_path):
+            if file.lower().endswith(".glb"):
+                names.append(os.path.splitext(file)[0])
+        if "idle" not in names:
+            raise ValueError("No idle animation found in options. Please provide an idle animation.")
+        names = ["idle"] + sorted(name for name in names if name != "idle")
+
+        paths, durations, frame_counts, bounds, tags, vectors, hashes, sources = [], [], [], [], [], [], [], []
+        for name in names:
+            path = os.path.join(animations_path, f"{name}.glb")
+            clip = load_clip(path)
+
+            vector_path = os.path.join(search_space_path, f"{name}.npy") if search_space_path else None
+            if vector_path and os.path.exists(vector_path):
+                landmarks = np.load(vector_path, allow_pickle=True)
+                sources.append(DETECTED)
+            else:
+                landmarks = np.mean(to_landmarks(clip), axis=0)
+                sources.append(SKELETON)
+
+            with open(path, "rb") as file:
+                hashes.append(hashlib.sha256(file.read()).hexdigest())
+            paths.append(path)
+            durations.append(clip.duration)
+            frame_counts.append(clip.frame_count)
+            bounds.append(clip.bounds())
+            tags.append(tuple(name.split("_")))
+            vectors.append(BodyModel(data=landmarks).get_angle_vector())
+
+        skeleton = [name for name, source in zip(names, sources) if source == SKELETON]
+        if skeleton:
+            logger.warning("No detected search space vector for %d animations, using their skeleton vectors: %s",
+                           len(skeleton), ", ".join(skeleton))
+        return cls(names, paths, durations, frame_counts, bounds, tags, vectors, hashes, sources)
+
+    def save(self, path: str, fingerprint: str = ""):
+        np.savez(
+            path,
+            version=np.int32(CATALOG_VERSION),
+            fingerprint=np.str_(fingerprint),
+            names=np.array(self.names, dtype=np.str_),
+            paths=np.array(self.paths, dtype=np.str_),
+            durations=self.durations,
+            frame_counts=self.frame_counts,
+            bounds=self.bounds,
+            tags=np.array([",".join(tag) for tag in self.tags], dtype=np.str_),
+            vectors=self.vectors,
+            hashes=np.array(self.hashes, dtype=np.str_),
+            sources=np.array(self.sources, dtype=np.str_),
+        )
+
+    @classmethod
+    def load(cls, animations_path="lblm/data/animations", search_space_path="lblm/data/search_space",
+             cache_path: str | None = None):
+        """
+        Loads the catalog from its cache, or builds and caches it if the cache is missing or outdated.
+        :param animations_path: The folder of the .glb animations.
+        :param search_space_path: The folder of the .npy search space vectors.
+        :param cache_path: The cache file, by default catalog.npz next to the animations folder.
+        """
+        if cache_path is None:
+            cache_path = os.path.join(os.path.dirname(os.path.normpath(animations_path)), "catalog.npz")
+        fingerprint = directory_fingerprint(animations_path, search_space_path)
+
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if int(data["version"]) == CATALOG_VERSION and str(data["fingerprint"]) == fingerprint:
+                        return cls(
+                            data["names"].tolist(), data["paths"].tolist(), data["durations"], data["frame_counts"],
+                            data["bounds"], [tuple(tag.split(",")) for tag in data["tags"].tolist()], data["vectors"],
+                            data["hashes"].tolist(), data["sources"].tolist(),
+                        )
+            except Exception as e:
+                logger.warning("Could not read animation catalog %s: %s", cache_path, e)
+
+        catalog = cls.build(animations_path, search_space_path)
+        try:
+            catalog.save(cache_path, fingerprint)
+        except OSError as e:
+            logger.warning("Could not cache animation catalog %s: %s", cache_path, e)
+        logger.info("Built animation catalog with %d animations", len(catalog))
+        return catalog
@@ -0,0 +1,25 @@
+"""
+    The detection of a body as it is sent from the Detector to the Brain. Kept apart from the detector, so the processes
+    that only receive detections, like the replayer or a Brain listening for remote detectors, do not import OpenCV.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class BodyModel:
+    """Dataclass to store body pose landmarks with certainty values"""
+    landmarks: np.ndarray = None  # 4D array: [landmark_id, x, y, z, visibility]
+    frame_width: int = 0
+    frame_height: int = 0
+    timestamp: float = 0.0
+    process_time: float = 0.0
+    person_id: int = 0  # identity of the tracked person in multi person mode
+    kinematics: np.ndarray | None = None  # motion features of the frame, see kinematics.KinematicFeatures
+
+    def __post_init__(self):
+        if self.landmarks is None:
+            # Initialize with 33 pose landmarks, each with [x, y, z, visibility]
+            self.landmarks = np.zeros((33, 4), dtype=np.float32)
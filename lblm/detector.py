@@ -1,50 +1,93 @@
 import ssl
 import time
-from dataclasses import dataclass
 from multiprocessing import Process, Queue, Event
 
-import cv2
-import mediapipe as mp
 import numpy as np
 
-
-"""Fix SSL context for MediaPipe model downloads"""
-try:
-    # Try to create unverified HTTPS context
-    ssl._create_default_https_context = ssl._create_unverified_context
-    print("SSL context fixed for MediaPipe downloads")
-except Exception as e:
-    print(f"Could not fix SSL context: {e}")
-
-
-@dataclass
-class BodyModel:
-    """Dataclass to store body pose landmarks with certainty values"""
-    landmarks: np.ndarray = None  # 4D array: [landmark_id, x, y, z, visibility]
-    frame_width: int = 0
-    frame_height: int = 0
-    timestamp: float = 0.0
-    process_time: float = 0.0
-
-    def __post_init__(self):
-        if self.landmarks is None:
-            # Initialize with 33 pose landmarks, each with [x, y, z, visibility]
-            self.landmarks = np.zeros((33, 4), dtype=np.float32)
+from .aggregation import ChunkAggregator
+from .detection import BodyModel
+from .filters import OneEuroFilter
+from .kinematics import JOINT_NAMES, JOINT_ANGLES, KinematicFeatures, MOTION_ENERGY
+from .log import attach, current_level, current_queue, get_logger
+from .power import DETECTION_FPS, PowerState, PowerStateMachine
+from .profiling import Profiler
+from .quality import QualityController
+from .roi import RoiTracker
+from .recorder import LandmarkRecorder
+from .segmenter import GestureSegmenter
+from .startup import mark, stage
+
+logger = get_logger(__name__)
+
+
+def fix_ssl_context():
+    """Fix SSL context for MediaPipe model downloads, only in the detection process"""
+    try:
+        # Try to create unverified HTTPS context
+        ssl._create_default_https_context = ssl._create_unverified_context
+        logger.info("SSL context fixed for MediaPipe downloads")
+    except Exception as e:
+        logger.warning("Could not fix SSL context: %s", e)
+
+
+def extract_landmarks(landmarks, out: np.ndarray) -> np.ndarray:
+    """
+    Copies the landmarks of a pose into a reused array, the values are read from the fields of the landmarks.
+    :param landmarks: The landmarks of the pose, the landmark field of a NormalizedLandmarkList of the pose solution or
+        a pose of the results of the PoseLandmarker task, whose visibility can be None.
+    :param out: The (33, 4) array the x, y, z and visibility values are written to.
+    """
+    for index, landmark in enumerate(landmarks):
+        out[index] = landmark.x, landmark.y, landmark.z, landmark.visibility or 0.0
+    return out
 
 
 class Detector(Process):
     """Complete body landmark detection system running in separate process"""
 
-    def __init__(self, data_queue: Queue, stop_event: Event):
+    def __init__(self, data_queue: Queue, stop_event: Event, record_path: str | None = None,
+                 target_fps: float | None = 25, track_roi: bool = True, segment_gestures: bool = False,
+                 smooth: bool = True, power: PowerStateMachine | None = None, profile_dir: str | None = None):
+        """
+        :param data_queue: The queue the quantized detections are sent to.
+        :param stop_event: Stops the detection when set.
+        :param record_path: If given, the landmarks of every frame are recorded to this file, as they are sent: mapped
+            from the region of interest to the frame and smoothed.
+        :param target_fps: The frame rate the model complexity and input scale are adapted to.
+            If None, the full frame is processed with a fixed model complexity of 1.
+        :param track_roi: If only the region around the body of the last frame should be processed.
+        :param segment_gestures: If a detection is sent at the end of every gesture instead of every 6 seconds.
+        :param smooth: If the landmarks are smoothed over time to remove the jitter of the model.
+        :param power: The power state machine the detector drives, the detection rate is lowered and the overlays are
+            skipped while nobody is there. Runs at full rate all the time if None.
+        :param profile_dir: If given, the detection loop is profiled and the profile is written to this folder.
+        """
         super().__init__()
         self.data_queue = data_queue
         self.stop_event = stop_event
 
+        # optional recording of the processed landmark stream, replays feed the Brain the landmarks it saw live
+        self.record_path = record_path
+        self.recorder: LandmarkRecorder | None = None
+
         # Will be initialized in the process
+        self.cv2 = None
+        self.mp = None
         self.mp_pose = None
-        self.mp_drawing = None
-        self.mp_drawing_styles = None
         self.pose = None
+        self.connections: list[tuple[int, int]] = []
+
+        # adaptive inference quality
+        self.quality = QualityController(target_fps=target_fps) if target_fps else None
+        self.model_complexity = self.quality.complexity if self.quality else 1
+        self.input_scale = self.quality.scale if self.quality else 1.0
+
+        # region of interest around the body of the last frame
+        self.roi = RoiTracker() if track_roi else None
+
+        # reused frame and landmark buffers, keyed by name
+        self.buffers: dict[str, np.ndarray] = {}
+        self.body_data = BodyModel()
 
         # Pose landmark names for reference
         self.landmark_names = [
@@ -64,76 +107,156 @@ class Detector(Process):
         self.last_fps_time = time.time()
         self.fps = 0.0
 
-        self.quantization_chunk_length = 0
-        self.quantization_start = 0
-        self.chunk_amount = 0
-        self.chunk: BodyModel | None = None
-        self.reset_chunks()
-
-    def reset_chunks(self):
-        self.quantization_chunk_length = 6
-        self.quantization_start = time.time()
-        self.chunk_amount = 0
-        self.chunk = None
+        self.aggregator = GestureSegmenter() if segment_gestures else ChunkAggregator(chunk_length=6)
+        self.kinematics = KinematicFeatures()
+        self.filter = OneEuroFilter() if smooth else None
+        self.power = power
+        self.profile_dir = profile_dir
+        self.log_queue = current_queue()
+        self.log_level = current_level()
 
     def initialize_mediapipe(self):
-        """Initialize MediaPipe in the process"""
+        """Initialize MediaPipe and OpenCV in the process, they are only imported here"""
+        fix_ssl_context()
+        with stage("detector", "import cv2"):
+            import cv2
+        self.cv2 = cv2
+        with stage("detector", "import mediapipe"):
+            import mediapipe as mp
+        self.mp = mp
         self.mp_pose = mp.solutions.pose
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles
+        self.connections = sorted(self.mp_pose.POSE_CONNECTIONS)
+
+        with stage("detector", "create pose model"):
+            self.create_pose()
+
+    def create_pose(self):
+        """(Re)creates the MediaPipe Pose with the current model complexity"""
+        if self.pose:
+            self.pose.close()
 
         # Initialize MediaPipe Pose
         self.pose = self.mp_pose.Pose(
             static_image_mode=False,
-            model_complexity=1,
+            model_complexity=self.model_complexity,
             enable_segmentation=False,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
 
-    def process_frame(self, frame):
-        """Process a single frame and return landmarks data"""
-        start_time = time.time()
+    def apply_quality(self):
+        """Applies the level chosen by the quality controller"""
+        self.input_scale = self.quality.scale
+        if self.quality.complexity != self.model_complexity:
+            self.model_complexity = self.quality.complexity
+            self.create_pose()
+        logger.info("Detection quality changed to complexity %d at %.2fx scale", self.model_complexity, self.input_scale)
+
+    def get_buffer(self, name: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        """Returns a reusable buffer, it is only reallocated if the shape changes"""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer
+
+    def orient_frame(self, frame):
+        """Rotates the camera frame by 90deg counterclockwise and mirrors it horizontally in a single copy"""
+        # the rotation followed by the flip equals the transpose of the frame rotated by 180deg,
+        # which numpy expresses as a view, so the only copy is into the reused buffer
+        view = frame[::-1, ::-1].swapaxes(0, 1)
+        oriented = self.get_buffer("oriented", view.shape, frame.dtype)
+        np.copyto(oriented, view)
+        return oriented
+
+    def model_input(self, frame):
+        """Prepares the RGB input of the pose model, scaled down by the current input scale"""
+        # Scale down the input of the model, the landmarks are normalized so they are not affected
+        model_input = frame
+        if self.input_scale < 1.0:
+            size = (round(frame.shape[1] * self.input_scale), round(frame.shape[0] * self.input_scale))
+            model_input = self.get_buffer("scaled", (size[1], size[0], frame.shape[2]))
+            self.cv2.resize(frame, size, dst=model_input, interpolation=self.cv2.INTER_AREA)
 
         # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame = self.get_buffer("rgb", model_input.shape)
+        self.cv2.cvtColor(model_input, self.cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        return rgb_frame
+
+    def detect(self, frame):
+        """Runs the pose model on the frame"""
+        return self.pose.process(self.model_input(frame))
 
-        # Process the frame
-        results = self.pose.process(rgb_frame)
+    def process_frame(self, frame):
+        """Process a single frame and return landmarks data, the returned BodyModel is reused for the next frame"""
+        start_time = time.time()
+
+        # Process the region around the body of the last frame, or the full frame if the body was lost
+        region, pixels = self.roi.crop(frame) if self.roi else (frame, None)
+        results = self.detect(region)
+        if not results.pose_landmarks and pixels is not None:
+            self.roi.reset()
+            pixels = None
+            results = self.detect(frame)
 
-        # Create body data
-        body_data = BodyModel()
+        # Update the reused body data, the consumers copy what they keep
+        body_data = self.body_data
         body_data.frame_width = frame.shape[1]
         body_data.frame_height = frame.shape[0]
         body_data.timestamp = time.time()
         body_data.process_time = time.time() - start_time
+        body_data.kinematics = None
 
         # Extract landmarks
         if results.pose_landmarks:
-            # Draw landmarks on frame
-            self.mp_drawing.draw_landmarks(
-                frame,
-                results.pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec=self.mp_drawing_styles.get_default_pose_landmarks_style()
-            )
-
-            # Update dataclass with landmark data
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                body_data.landmarks[idx] = [
-                    landmark.x,
-                    landmark.y,
-                    landmark.z,
-                    landmark.visibility
-                ]
+            extract_landmarks(results.pose_landmarks.landmark, body_data.landmarks)
+
+            if pixels is not None:
+                # map the landmarks of the region back to the full frame
+                RoiTracker.to_frame(body_data.landmarks, pixels, body_data.frame_width, body_data.frame_height)
+            if self.filter:
+                self.filter.update(body_data.landmarks, body_data.timestamp)
+
+            # the features are updated in place, like the landmarks
+            body_data.kinematics = self.kinematics.update(body_data.landmarks, body_data.timestamp)
+
+            # Draw the landmarks that are sent on the frame
+            self.draw_skeleton(frame, body_data.landmarks)
+        else:
+            body_data.landmarks[:] = 0
+            # the motion of the next person does not continue the last one
+            self.kinematics.reset()
+            if self.filter:
+                self.filter.reset()
+
+        if self.roi:
+            self.roi.update(body_data.landmarks)
         return frame, body_data
 
+    def draw_skeleton(self, frame, landmarks: np.ndarray, color=(0, 255, 0), min_visibility: float = 0.5):
+        """Draws the connections and joints of the visible landmarks, the pixel positions are computed in reused buffers"""
+        scaled = self.get_buffer("scaled_points", (len(landmarks), 2), np.float32)
+        np.multiply(landmarks[:, :2], (frame.shape[1], frame.shape[0]), out=scaled)
+        points = self.get_buffer("points", scaled.shape, np.int32)
+        np.copyto(points, scaled, casting="unsafe")
+        visible = self.get_buffer("visible", (len(landmarks),), bool)
+        np.greater(landmarks[:, 3], min_visibility, out=visible)
+
+        points, visible = points.tolist(), visible.tolist()
+        for start, end in self.connections:
+            if visible[start] and visible[end]:
+                self.cv2.line(frame, points[start], points[end], color, 2)
+        for point, is_visible in zip(points, visible):
+            if is_visible:
+                self.cv2.circle(frame, point, 3, color, -1)
+
     def get_body_info(self, body_data: BodyModel):
         """Get current body landmarks information as string"""
         info_lines = []
         info_lines.append(f"Frame: {body_data.frame_width}x{body_data.frame_height}")
         info_lines.append(f"Process time: {body_data.process_time * 1000:.1f}ms")
         info_lines.append(f"FPS: {self.fps:.1f}")
+        info_lines.append(f"Model: complexity {self.model_complexity}, {self.input_scale:.2f}x scale")
 
         # Check if any landmarks are detected
         if np.any(body_data.landmarks):
@@ -160,36 +283,38 @@ class Detector(Process):
         return info_lines
 
     def get_body_angles(self, body_data: BodyModel):
-        """Calculate some basic body angles"""
-        if not np.any(body_data.landmarks):
+        """The joint angles and the motion energy computed by the kinematic features"""
+        if body_data.kinematics is None:
             return []
 
-        angles = []
-
-        # Left arm angle
-        l_shoulder = body_data.landmarks[11][:2]
-        l_elbow = body_data.landmarks[13][:2]
-        l_wrist = body_data.landmarks[15][:2]
-
-        if all(body_data.landmarks[i][3] > 0.5 for i in [11, 13, 15]):
-            v1 = l_shoulder - l_elbow
-            v2 = l_wrist - l_elbow
-            angle = np.arccos(np.clip(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)), -1.0, 1.0))
-            angles.append(f"L_ARM_ANGLE: {np.degrees(angle):.1f}°")
-
-        # Right arm angle
-        r_shoulder = body_data.landmarks[12][:2]
-        r_elbow = body_data.landmarks[14][:2]
-        r_wrist = body_data.landmarks[16][:2]
-
-        if all(body_data.landmarks[i][3] > 0.5 for i in [12, 14, 16]):
-            v1 = r_shoulder - r_elbow
-            v2 = r_wrist - r_elbow
-            angle = np.arccos(np.clip(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)), -1.0, 1.0))
-            angles.append(f"R_ARM_ANGLE: {np.degrees(angle):.1f}°")
-
+        # the elbows and the knees
+        joint_angles = np.degrees(body_data.kinematics[JOINT_ANGLES])
+        angles = [f"{JOINT_NAMES[index]}: {joint_angles[index]:.1f}°" for index in (0, 1, 8, 9)]
+        angles.append(f"MOTION: {body_data.kinematics[MOTION_ENERGY]:.3f}")
         return angles
 
+    def send(self, body_data: BodyModel):
+        """Adds the frame to the current chunk and sends the chunk to the main process once it is complete"""
+        try:
+            chunk = self.aggregator.update(body_data)
+            if chunk is not None:
+                self.data_queue.put(chunk, block=False)
+                logger.debug("Quantized detection chunk sent to main process")
+        except Exception as e:
+
+            pass  # Queue full, skip
+
+    def throttle(self, cap, last_start: float):
+        """Waits until the next detection is due in the current power state, the frames in between are only grabbed"""
+        state = self.power.state
+        if state == PowerState.ACTIVE:
+            return
+        # grabbing without decoding keeps the camera buffer fresh, so the next detection sees the current frame
+        next_start = last_start + 1 / DETECTION_FPS[state]
+        while time.time() < next_start and not self.stop_event.is_set():
+            if not cap.grab():
+                break
+
     def update_fps(self):
         """Update FPS counter"""
         self.frame_count += 1
@@ -201,82 +326,87 @@ class Detector(Process):
 
     def run(self):
         """Main detection loop running in separate process"""
-        print("Starting body landmark detection process...")
+        attach(self.log_queue, self.log_level)
+        logger.info("Starting body landmark detection process...")
+        profiler = None
+        if self.profile_dir:
+            profiler = Profiler("detector", self.profile_dir)
+            profiler.instrument(self, "process_frame")
+            profiler.start()
 
         # Initialize MediaPipe in this process
         self.initialize_mediapipe()
 
         # Initialize camera
-        cap = cv2.VideoCapture(0)
+        with stage("detector", "open camera"):
+            cap = self.cv2.VideoCapture(0)
         if not cap.isOpened():
-            print("Error: Could not open camera")
+            logger.error("Could not open camera")
             return
 
-        print("Body Landmark Detection Started in separate process.")
-        print("Controls: 'q' to quit, 'p' to print landmark data, 'a' to toggle angles")
+        if self.record_path:
+            self.recorder = LandmarkRecorder(self.record_path)
+            logger.info("Recording landmarks to %s", self.record_path)
+
+        logger.info("Body Landmark Detection Started in separate process.")
+        logger.info("Controls: 'q' to quit, 'p' to print landmark data, 'a' to toggle angles")
 
+        last_start = 0.0
+        first_frame = True
         while not self.stop_event.is_set():
+            if self.power:
+                self.throttle(cap, last_start)
+            last_start = time.time()
             ret, frame = cap.read()
 
-            # rotate the frame by 90deg
-            frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
             if not ret:
-                print("Error: Could not read frame")
+                logger.error("Could not read frame")
                 break
 
-            # Flip frame horizontally for mirror effect
-            frame = cv2.flip(frame, 1)
+            # rotate the frame by 90deg and flip it horizontally for mirror effect
+            frame = self.orient_frame(frame)
 
             # Process frame
             processed_frame, body_data = self.process_frame(frame)
+            if self.quality and self.quality.update(body_data.process_time):
+                self.apply_quality()
+            if self.recorder:
+                self.recorder.write(body_data.landmarks, body_data.timestamp)
+            active = not self.power or self.power.update(body_data.landmarks, body_data.timestamp) == PowerState.ACTIVE
 
             # Update FPS
             self.update_fps()
 
-            # Get info and angle data
-            info_lines = self.get_body_info(body_data)
-            if self.show_angles:
-                angle_lines = self.get_body_angles(body_data)
-                info_lines.extend(angle_lines)
-
-            # Add info text overlay
-            y_offset = 30
-            for line in info_lines:
-                cv2.putText(processed_frame, line, (10, y_offset),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                y_offset += 25
-
-            # Add control instructions
-            cv2.putText(processed_frame, "Press 'q':quit, 'p':print data, 'a':toggle angles",
-                        (10, processed_frame.shape[0] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            if active:
+                # Get info and angle data
+                info_lines = self.get_body_info(body_data)
+                if self.show_angles:
+                    angle_lines = self.get_body_angles(body_data)
+                    info_lines.extend(angle_lines)
+
+                # Add info text overlay
+                y_offset = 30
+                for line in info_lines:
+                    self.cv2.putText(processed_frame, line, (10, y_offset),
+                                     self.cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                    y_offset += 25
+
+                # Add control instructions
+                self.cv2.putText(processed_frame, "Press 'q':quit, 'p':print data, 'a':toggle angles",
+                                 (10, processed_frame.shape[0] - 10),
+                                 self.cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
             # Send data to main process (non-blocking)
-            try:
-                tracked_time = time.time() - self.quantization_start
-                if tracked_time > self.quantization_chunk_length:
-                    if self.chunk is not None:
-                        self.chunk.landmarks *= 1 / self.chunk_amount  # Average landmarks
-                        self.data_queue.put(self.chunk, block=False)
-                        print("Quantized detection chunk sent to main process")
-                        self.reset_chunks()
-                else:
-                    if self.chunk is None:
-                        self.chunk = body_data
-                        self.quantization_start = time.time()
-                    else:
-                        self.chunk.landmarks += body_data.landmarks
-                        self.chunk_amount += 1
-            except Exception as e:
-
-                pass  # Queue full, skip
+            self.send(body_data)
 
             # Display frame
-            cv2.imshow('Body Landmark Detection', processed_frame)
+            self.cv2.imshow('Body Landmark Detection', processed_frame)
+            if first_frame:
+                mark("detector", "first frame shown")
+                first_frame = False
 
             # Handle key presses
-            key = cv2.waitKey(1) & 0xFF
+            key = self.cv2.waitKey(1) & 0xFF
             if key == ord('q'):
                 self.stop_event.set()
                 break
@@ -295,11 +425,15 @@ class Detector(Process):
                 print(f"Angle display: {'ON' if self.show_angles else 'OFF'}")
 
         # Cleanup
+        if self.recorder:
+            self.recorder.close()
         cap.release()
-        cv2.destroyAllWindows()
+        self.cv2.destroyAllWindows()
         if self.pose:
             self.pose.close()
-        print("Body landmark detection process stopped")
+        if profiler:
+            profiler.stop()
+        logger.info("Body landmark detection process stopped")
 
 
 class BodyLandmarkSystem:
@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class OneEuroFilter:
+    """
+    Smooths all 33x4 landmark values at once with a One Euro filter, an adaptive low pass filter.
+    While a landmark moves slowly its cutoff frequency is low and the jitter is removed, fast movements raise the cutoff
+    so the landmark follows without lag. Landmarks below the minimum visibility are not trusted, they keep their last
+    filtered position until they are visible again. The state lives in preallocated arrays, the time steps are taken
+    from the frame timestamps.
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 10.0, derivative_cutoff: float = 1.0,
+                 min_visibility: float = 0.3, shape=(33, 4)):
+        """
+        :param min_cutoff: The cutoff frequency in Hz of a still landmark, lower values smooth more.
+        :param beta: How much the cutoff frequency rises with the speed in normalized units per second.
+        :param derivative_cutoff: The cutoff frequency in Hz of the speed estimate.
+        :param min_visibility: The visibility below which a landmark holds its last position.
+        :param shape: The shape of the landmarks, the last value of a landmark is its visibility.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.min_visibility = min_visibility
+
+        self.value = np.zeros(shape, dtype=np.float32)
+        self.derivative = np.zeros(shape, dtype=np.float32)
+        self.initialized = np.zeros(shape[0], dtype=bool)
+        self.last_timestamp: float | None = None
+
+        self._raw_derivative = np.zeros(shape, dtype=np.float32)
+        self._cutoff = np.zeros(shape, dtype=np.float32)
+        self._alpha = np.zeros(shape, dtype=np.float32)
+        self._visible = np.zeros(shape[0], dtype=bool)
+        self._new = np.zeros(shape[0], dtype=bool)
+
+    def reset(self):
+        self.derivative[:] = 0
+        self.initialized[:] = False
+        self.last_timestamp = None
+
+    def update(self, landmarks: np.ndarray, timestamp: float) -> np.ndarray:
+        """
+        Filters the landmarks of a frame in place.
+        :param landmarks: The landmarks of the frame, they are overwritten by the filtered ones.
+        :param timestamp: The time of the frame in seconds.
+        :return: The filtered landmarks.
+        """
+        np.greater_equal(landmarks[:, -1], self.min_visibility, out=self._visible)
+        dt = timestamp - self.last_timestamp if self.last_timestamp is not None else 0.0
+        self.last_timestamp = timestamp
+
+        # landmarks seen for the first time start the filter at their position
+        np.logical_not(self.initialized, out=self._new)
+        np.logical_and(self._new, self._visible, out=self._new)
+        np.copyto(self.value, landmarks, where=self._new[:, None])
+        np.copyto(self.derivative, 0, where=self._new[:, None])
+        np.logical_or(self.initialized, self._visible, out=self.initialized)
+
+        if dt > 0:
+            # speed estimate, smoothed with a fixed cutoff
+            derivative = self._raw_derivative
+            np.subtract(landmarks, self.value, out=derivative)
+            np.multiply(derivative, 1 / dt, out=derivative)
+            np.subtract(derivative, self.derivative, out=derivative)
+            np.multiply(derivative, self.smoothing_factor(self.derivative_cutoff, dt), out=derivative)
+            np.add(self.derivative, derivative, out=derivative)
+
+            # the cutoff rises with the speed, alpha = 1 / (1 + tau / dt) with tau = 1 / (2 pi cutoff)
+            np.abs(derivative, out=self._cutoff)
+            np.multiply(self._cutoff, self.beta, out=self._cutoff)
+            np.add(self._cutoff, self.min_cutoff, out=self._cutoff)
+            np.multiply(self._cutoff, 2 * np.pi * dt, out=self._alpha)
+            np.add(self._alpha, 1, out=self._cutoff)
+            np.divide(self._alpha, self._cutoff, out=self._alpha)
+
+            # only the visible landmarks move on, the others keep their state
+            np.copyto(self.derivative, derivative, where=self._visible[:, None])
+            np.subtract(landmarks, self.value, out=self._cutoff)
+            np.multiply(self._cutoff, self._alpha, out=self._cutoff)
+            np.add(self.value, self._cutoff, out=self._cutoff)
+            np.copyto(self.value, self._cutoff, where=self._visible[:, None])
+
+        # hidden landmarks keep their last position but report their current visibility
+        np.copyto(landmarks[:, :-1], self.value[:, :-1], where=self.initialized[:, None])
+        np.copyto(landmarks[:, -1], self.value[:, -1], where=self._visible)
+        return landmarks
+
+    @staticmethod
+    def smoothing_factor(cutoff: float, dt: float) -> float:
+        rate = 2 * np.pi * cutoff * dt
+        return rate / (rate + 1)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from .body_model import BONES, BodyModel
+
+# landmarks that are part of the bones used for matching
+KEY_LANDMARKS = np.unique(np.array(BONES).flatten())
+
+
+class PoseGate:
+    """
+    Decides whether an incoming pose is worth an inference.
+    A visitor is considered present while the visibility of the matched landmarks is high enough, with separate
+    thresholds for arriving and leaving so the presence does not flicker. While present, a pose only passes the gate if
+    its angle vector moved far enough away from the last pose that passed.
+    """
+
+    def __init__(self, threshold: float = 0.35, enter_visibility: float = 0.6, exit_visibility: float = 0.4):
+        """
+        :param threshold: The mean angular distance in radians a pose needs to have to the last inferred pose.
+            A threshold of 0 lets every present pose pass.
+        :param enter_visibility: The mean visibility above which a visitor counts as arrived.
+        :param exit_visibility: The mean visibility below which a visitor counts as gone.
+        """
+        if exit_visibility > enter_visibility:
+            raise ValueError("The exit visibility must not be higher than the enter visibility")
+
+        self.threshold = threshold
+        self.enter_visibility = enter_visibility
+        self.exit_visibility = exit_visibility
+
+        self.present = False
+        self.reference: np.ndarray | None = None
+
+    def reset(self):
+        self.present = False
+        self.reference = None
+
+    def update_presence(self, landmarks: np.ndarray) -> bool:
+        """
+        Updates the presence state from the visibility channel.
+        :param landmarks: The (33, 4) landmarks of the pose.
+        :return: If a visitor is present.
+        """
+        visibility = float(np.mean(landmarks[KEY_LANDMARKS, 3]))
+        if self.present:
+            self.present = visibility >= self.exit_visibility
+        else:
+            self.present = visibility >= self.enter_visibility
+
+        if not self.present:
+            # a returning visitor always gets a response
+            self.reference = None
+        return self.present
+
+    @staticmethod
+    def distance(a: np.ndarray, b: np.ndarray) -> float:
+        """The mean absolute angular distance between two angle vectors, respecting the wrap around at +-pi."""
+        delta = (a - b + np.pi) % (2 * np.pi) - np.pi
+        return float(np.mean(np.abs(delta)))
+
+    def check(self, landmarks: np.ndarray, angles: np.ndarray | None = None) -> bool:
+        """
+        :param landmarks: The (33, 4) landmarks of the pose.
+        :param angles: The angle vector of the pose, computed from the landmarks if not given.
+        :return: If the pose should be inferred.
+        """
+        if not self.update_presence(landmarks):
+            return False
+
+        if angles is None:
+            angles = BodyModel(data=landmarks).get_angle_vector()
+
+        if self.reference is not None and self.distance(angles, self.reference) < self.threshold:
+            return False
+
+        self.reference = angles
+        return True
@@ -0,0 +1,152 @@
+import numpy as np
+
+from .body_model import BONES
+
+# (a, b, c) landmarks of the joints, the angle is measured at b between the segments to a and c
+ANGLE_JOINTS = np.array([
+    [11, 13, 15],  # left elbow
+    [12, 14, 16],  # right elbow
+    [13, 11, 23],  # left shoulder
+    [14, 12, 24],  # right shoulder
+    [15, 17, 19],  # left wrist
+    [16, 18, 20],  # right wrist
+    [11, 23, 25],  # left hip
+    [12, 24, 26],  # right hip
+    [23, 25, 27],  # left knee
+    [24, 26, 28],  # right knee
+    [25, 27, 31],  # left ankle
+    [26, 28, 32],  # right ankle
+])
+JOINT_NAMES = ["L_ELBOW", "R_ELBOW", "L_SHOULDER", "R_SHOULDER", "L_WRIST", "R_WRIST",
+               "L_HIP", "R_HIP", "L_KNEE", "R_KNEE", "L_ANKLE", "R_ANKLE"]
+
+N_JOINTS = len(ANGLE_JOINTS)
+N_BONES = len(BONES)
+
+# layout of the feature vector
+JOINT_ANGLES = slice(0, N_JOINTS)
+ANGULAR_VELOCITY = slice(N_JOINTS, N_JOINTS + 2 * N_BONES)
+MOTION_ENERGY = N_JOINTS + 2 * N_BONES
+ENERGY_MEAN = MOTION_ENERGY + 1
+ENERGY_STD = MOTION_ENERGY + 2
+N_FEATURES = MOTION_ENERGY + 3
+
+
+class KinematicFeatures:
+    """
+    Computes motion features of the landmark stream incrementally, one frame at a time.
+    All features live in a single preallocated vector, updated in place with vectorized operations:
+    the angles of the limb joints, the angular velocities of the matching bones in rad/s and the motion energy, the
+    visibility weighted mean squared angular velocity smoothed over time, together with its long term mean and standard
+    deviation. No history of the stream is stored, every statistic is an exponential moving average over the timestamps.
+    """
+
+    def __init__(self, time_constant: float = 0.25, statistics_time_constant: float = 5.0):
+        """
+        :param time_constant: The time in seconds the motion energy is smoothed over.
+        :param statistics_time_constant: The time in seconds the mean and deviation of the motion energy cover.
+        """
+        self.time_constant = time_constant
+        self.statistics_time_constant = statistics_time_constant
+
+        self.vector = np.zeros(N_FEATURES, dtype=np.float32)
+        self.joint_angles = self.vector[JOINT_ANGLES]
+        self.angular_velocity = self.vector[ANGULAR_VELOCITY].reshape(N_BONES, 2)
+
+        # bone and joint landmark indices
+        bones = np.array(BONES)
+        self._bone_start, self._bone_end = bones[:, 0], bones[:, 1]
+        self._joint_a, self._joint_b, self._joint_c = ANGLE_JOINTS[:, 0], ANGLE_JOINTS[:, 1], ANGLE_JOINTS[:, 2]
+
+        # state and scratch buffers
+        self.bone_angles = np.zeros((N_BONES, 2), dtype=np.float32)
+        self._previous_angles = np.zeros((N_BONES, 2), dtype=np.float32)
+        self._points = np.zeros((3, N_JOINTS, 3), dtype=np.float32)
+        self._segments = np.zeros((2, N_JOINTS, 3), dtype=np.float32)
+        self._joint_values = np.zeros((3, N_JOINTS), dtype=np.float32)
+        self._bone_points = np.zeros((2, N_BONES, 4), dtype=np.float32)
+        self._bones = np.zeros((N_BONES, 3), dtype=np.float32)
+        self._bone_visibility = np.zeros(N_BONES, dtype=np.float32)
+        self._planar = np.zeros(N_BONES, dtype=np.float32)
+        self._difference = np.zeros((N_BONES, 2), dtype=np.float32)
+        self._variance = 0.0
+        self.last_timestamp: float | None = None
+
+    def reset(self):
+        self.vector[:] = 0
+        self._variance = 0.0
+        self.last_timestamp = None
+
+    @property
+    def motion_energy(self) -> float:
+        return float(self.vector[MOTION_ENERGY])
+
+    def update(self, landmarks: np.ndarray, timestamp: float) -> np.ndarray:
+        """
+        Adds a frame.
+        :param landmarks: The (33, 4) landmarks with x, y, z and visibility.
+        :param timestamp: The time of the frame in seconds.
+        :return: The feature vector, it is updated in place by the next frame.
+        """
+        self._update_joint_angles(landmarks)
+        self._update_bone_angles(landmarks)
+
+        dt = timestamp - self.last_timestamp if self.last_timestamp is not None else 0.0
+        if dt > 0:
+            # wrapped angle difference, scaled to rad/s and weighted by the visibility of the bone
+            np.subtract(self.bone_angles, self._previous_angles, out=self._difference)
+            np.add(self._difference, np.pi, out=self._difference)
+            np.mod(self._difference, 2 * np.pi, out=self._difference)
+            np.subtract(self._difference, np.pi, out=self._difference)
+            np.multiply(self._difference, 1 / dt, out=self.angular_velocity)
+            np.multiply(self.angular_velocity, self._bone_visibility[:, None], out=self.angular_velocity)
+
+            energy = float(np.einsum("ij,ij->", self.angular_velocity, self.angular_velocity)) / self.angular_velocity.size
+            alpha = 1 - np.exp(-dt / self.time_constant)
+            self.vector[MOTION_ENERGY] += alpha * (energy - self.vector[MOTION_ENERGY])
+
+            # exponentially weighted mean and variance of the smoothed energy
+            smoothed = float(self.vector[MOTION_ENERGY])
+            beta = 1 - np.exp(-dt / self.statistics_time_constant)
+            deviation = smoothed - float(self.vector[ENERGY_MEAN])
+            self.vector[ENERGY_MEAN] += beta * deviation
+            self._variance = (1 - beta) * (self._variance + beta * deviation * deviation)
+            self.vector[ENERGY_STD] = np.sqrt(self._variance)
+        elif self.last_timestamp is None:
+            self.angular_velocity[:] = 0
+
+        self._previous_angles[:] = self.bone_angles
+        self.last_timestamp = timestamp
+        return self.vector
+
+    def _update_joint_angles(self, landmarks: np.ndarray):
+        points, segments, values = self._points, self._segments, self._joint_values
+        np.take(landmarks[:, :3], self._joint_a, axis=0, out=points[0])
+        np.take(landmarks[:, :3], self._joint_b, axis=0, out=points[1])
+        np.take(landmarks[:, :3], self._joint_c, axis=0, out=points[2])
+        np.subtract(points[0], points[1], out=segments[0])
+        np.subtract(points[2], points[1], out=segments[1])
+
+        # cos = a.c / sqrt(|a|^2 |c|^2)
+        np.einsum("ij,ij->i", segments[0], segments[1], out=values[0])
+        np.einsum("ij,ij->i", segments[0], segments[0], out=values[1])
+        np.einsum("ij,ij->i", segments[1], segments[1], out=values[2])
+        np.multiply(values[1], values[2], out=values[1])
+        np.sqrt(values[1], out=values[1])
+        np.maximum(values[1], 1e-12, out=values[1])
+        np.divide(values[0], values[1], out=values[0])
+        np.clip(values[0], -1.0, 1.0, out=values[0])
+        np.arccos(values[0], out=self.joint_angles)
+
+    def _update_bone_angles(self, landmarks: np.ndarray):
+        """The bone directions as in BodyModel.get_angle_vector"""
+        start, end, bones = self._bone_points[0], self._bone_points[1], self._bones
+        np.take(landmarks, self._bone_start, axis=0, out=start)
+        np.take(landmarks, self._bone_end, axis=0, out=end)
+        np.multiply(start[:, 3], end[:, 3], out=self._bone_visibility)
+        np.subtract(end[:, :3], start[:, :3], out=bones)
+        np.multiply(bones, self._bone_visibility[:, None], out=bones)
+
+        np.arctan2(bones[:, 1], bones[:, 0], out=self.bone_angles[:, 0])
+        np.hypot(bones[:, 0], bones[:, 1], out=self._planar)
+        np.arctan2(bones[:, 2], self._planar, out=self.bone_angles[:, 1])
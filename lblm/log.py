@@ -0,0 +1,159 @@
+"""
+    Logging of all processes through one background writer, so logging never blocks capture, inference or rendering.
+    Every process hands its records to a shared queue, a listener thread in the main process writes them to the console
+    and optionally to a JSONL file with one object per record. Repeated messages are rate limited where they are logged,
+    a full queue drops records instead of waiting.
+
+        from .log import get_logger
+        logger = get_logger(__name__)
+        logger.info("Closest match: %s", name, extra={"person_id": person_id})
+
+    The format string of a message identifies it for the rate limit, so the values go into the arguments.
+"""
+
+import json
+import logging
+import logging.handlers
+import multiprocessing
+from multiprocessing.queues import Queue
+import queue
+
+# the attributes every record has, everything else was passed as extra
+_RECORD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+# the queue of the running listener, taken along by the processes created afterwards
+_queue: Queue | None = None
+_level = logging.INFO
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one compact JSON object, the extra fields of the record are included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "process": record.processName,
+            "thread": record.threadName,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets every message through at most a few times per interval, the message is identified by its format string.
+    The next record that passes reports how many were suppressed in between.
+    """
+
+    def __init__(self, interval: float = 1.0, burst: int = 5):
+        """
+        :param interval: The number of seconds a message is limited over.
+        :param burst: The number of records of a message passed per interval.
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.windows: dict[tuple, list] = {}  # (logger, level, message) -> [window start, passed, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg)
+        window = self.windows.get(key)
+        if window is None or record.created - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            self.windows[key] = [record.created, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records if the queue is full instead of blocking the logging thread"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(processName)s: %(message)s", datefmt="%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} ({suppressed} similar suppressed)" if suppressed else line
+
+
+def start(level: int | str = logging.INFO, jsonl_path: str | None = None, max_queue: int = 10000):
+    """
+    Starts the background writer in the main process and routes the logging of this process to it.
+    :param level: The minimum level that is logged.
+    :param jsonl_path: If given, every record is also appended to this file as one JSON object per line.
+    :param max_queue: The number of records that can wait for the writer, newer ones are dropped beyond that.
+    :return: The listener, stop it to flush the remaining records.
+    """
+    global _queue, _level
+    _queue = multiprocessing.Queue(max_queue)
+    _level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    console = logging.StreamHandler()
+    console.setFormatter(ConsoleFormatter())
+    handlers: list[logging.Handler] = [console]
+    if jsonl_path:
+        file = logging.FileHandler(jsonl_path, encoding="utf-8")
+        file.setFormatter(JsonFormatter())
+        handlers.append(file)
+
+    listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    attach(_queue, _level)
+    return listener
+
+
+def attach(log_queue: Queue | None, level: int | None = None):
+    """
+    Routes the logging of the calling process to the background writer, called at the start of every process.
+    Does nothing if logging was not started or the process is already attached, e.g. because it was forked.
+    """
+    if log_queue is None:
+        return
+    root = logging.getLogger()
+    if any(isinstance(handler, DroppingQueueHandler) for handler in root.handlers):
+        return
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+    root.addHandler(handler)
+    root.setLevel(level if level is not None else _level)
+
+
+def current_queue() -> Queue | None:
+    """The queue of the background writer, to pass it to processes that are started later"""
+    return _queue
+
+
+def current_level() -> int:
+    return _level
@@ -0,0 +1,242 @@
+import copy
+import os
+import queue
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from multiprocessing import Queue, Event
+
+import numpy as np
+
+from .aggregation import ChunkAggregator
+from .detection import BodyModel
+from .detector import Detector, extract_landmarks
+from .filters import OneEuroFilter
+from .kinematics import KinematicFeatures
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_PATH = "lblm/data/models"
+MODEL_URL = "https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_{variant}/float16/latest/pose_landmarker_{variant}.task"
+# the model variants matching the model complexities of the single person pose
+MODEL_VARIANTS = {0: "lite", 1: "full", 2: "heavy"}
+
+TORSO = [11, 12, 23, 24]
+
+# colors to tell the tracked persons apart in the preview
+COLORS = [(0, 255, 0), (255, 128, 0), (0, 128, 255), (255, 0, 255), (0, 255, 255), (255, 255, 0)]
+
+
+def get_model(complexity: int, path=MODEL_PATH) -> str:
+    """
+    Returns the path to the pose landmarker model of the complexity, the model is downloaded on first use.
+    :param complexity: The model complexity, 0 (lite), 1 (full) or 2 (heavy).
+    :param path: The folder the models are stored in.
+    """
+    variant = MODEL_VARIANTS[complexity]
+    model_path = os.path.join(path, f"pose_landmarker_{variant}.task")
+    if not os.path.exists(model_path):
+        os.makedirs(path, exist_ok=True)
+        logger.info("Downloading pose landmarker model %s", variant)
+        urllib.request.urlretrieve(MODEL_URL.format(variant=variant), model_path + ".part")
+        os.replace(model_path + ".part", model_path)
+    return model_path
+
+
+def body_center(landmarks: np.ndarray) -> np.ndarray:
+    """The visibility weighted center of the torso, or of all landmarks if the torso is not visible"""
+    torso = landmarks[TORSO]
+    weights = torso[:, 3]
+    if np.sum(weights) < 1e-3:
+        torso = landmarks
+        weights = landmarks[:, 3] + 1e-6
+    return np.average(torso[:, :2], axis=0, weights=weights)
+
+
+@dataclass
+class Track:
+    """A tracked person with its own aggregation stream"""
+    person_id: int
+    center: np.ndarray
+    last_seen: float
+    aggregator: ChunkAggregator
+    kinematics: KinematicFeatures = field(default_factory=KinematicFeatures)
+    filter: OneEuroFilter = field(default_factory=OneEuroFilter)
+    body: BodyModel = field(default_factory=BodyModel)  # reused for every frame of the person
+
+
+class PersonTracker:
+    """
+    Keeps the identity of persons across frames.
+    The detections of a frame are assigned to the known tracks by minimizing the distance of the torso centers.
+    Assignments further than the maximum distance start a new track, tracks that were not seen for a while are dropped.
+    """
+
+    def __init__(self, max_distance: float = 0.15, max_age: float = 1.0, chunk_length: float = 6, aggregator=None):
+        """
+        :param max_distance: The maximum distance in normalized frame coordinates a person moves between two frames.
+        :param max_age: The number of seconds a track is kept without being seen.
+        :param chunk_length: The length of the quantization chunks of each track in seconds.
+        :param aggregator: The aggregator every track gets a copy of, a ChunkAggregator of the chunk length if None.
+        """
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.chunk_length = chunk_length
+        self.aggregator = aggregator
+
+        self.tracks: list[Track] = []
+        self.lost: list[Track] = []  # the tracks dropped by the last update
+        self.next_id = 0
+
+    def update(self, bodies: list[np.ndarray], timestamp: float) -> list[Track]:
+        """
+        :param bodies: The (33, 4) landmarks of each person detected in the frame.
+        :param timestamp: The time of the frame.
+        :return: The track of each body.
+        """
+        self.lost = [track for track in self.tracks if timestamp - track.last_seen > self.max_age]
+        self.tracks = [track for track in self.tracks if timestamp - track.last_seen <= self.max_age]
+
+        centers = np.array([body_center(body) for body in bodies]).reshape(-1, 2)
+        assigned: list[Track | None] = [None] * len(bodies)
+
+        if self.tracks and len(bodies):
+            from scipy.optimize import linear_sum_assignment
+
+            track_centers = np.array([track.center for track in self.tracks])
+            cost = np.linalg.norm(track_centers[:, None, :] - centers[None, :, :], axis=2)
+            for track_index, body_index in zip(*linear_sum_assignment(cost)):
+                if cost[track_index, body_index] <= self.max_distance:
+                    assigned[body_index] = self.tracks[track_index]
+
+        for index, track in enumerate(assigned):
+            if track is None:
+                aggregator = copy.deepcopy(self.aggregator) if self.aggregator else ChunkAggregator(self.chunk_length)
+                track = Track(self.next_id, centers[index], timestamp, aggregator)
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[index] = track
+            track.center = centers[index]
+            track.last_seen = timestamp
+        return assigned
+
+
+class MultiPersonDetector(Detector):
+    """
+    Detects and tracks multiple persons with the MediaPipe Tasks pose landmarker.
+    Each tracked person gets its own quantization stream, the chunks are sent with the person id of the track.
+    The region of interest tracking of the single person detector is not used, as the persons are spread over the frame.
+    """
+
+    def __init__(self, data_queue: Queue, stop_event: Event, num_poses: int = 5, **kwargs):
+        """
+        :param num_poses: The maximum number of persons detected per frame.
+        :param kwargs: Passed on to the Detector.
+        """
+        kwargs["track_roi"] = False
+        super().__init__(data_queue, stop_event, **kwargs)
+        self.num_poses = num_poses
+        self.tracker = PersonTracker(aggregator=self.aggregator)
+        self.bodies: list[tuple[Track, BodyModel]] = []
+        self.last_timestamp_ms = 0
+        # the landmarks of the detected poses before they are assigned to the tracks
+        self.detections = np.zeros((num_poses, 33, 4), dtype=np.float32)
+
+    def create_pose(self):
+        """(Re)creates the pose landmarker with the model matching the current model complexity"""
+        from mediapipe.tasks.python import BaseOptions
+        from mediapipe.tasks.python import vision
+
+        if self.pose:
+            self.pose.close()
+
+        options = vision.PoseLandmarkerOptions(
+            base_options=BaseOptions(model_asset_path=get_model(self.model_complexity)),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=self.num_poses,
+            min_pose_detection_confidence=0.5,
+            min_pose_presence_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        self.pose = vision.PoseLandmarker.create_from_options(options)
+
+    def process_frame(self, frame):
+        """Process a single frame, the bodies of all tracked persons are kept for sending"""
+        start_time = time.time()
+
+        # the video mode requires strictly increasing timestamps
+        timestamp_ms = max(int(time.monotonic() * 1000), self.last_timestamp_ms + 1)
+        self.last_timestamp_ms = timestamp_ms
+
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=self.model_input(frame))
+        results = self.pose.detect_for_video(image, timestamp_ms)
+
+        timestamp = time.time()
+        process_time = timestamp - start_time
+        for pose, landmarks in zip(results.pose_landmarks, self.detections):
+            extract_landmarks(pose, landmarks)
+        bodies = list(self.detections[:len(results.pose_landmarks)])
+        tracks = self.tracker.update(bodies, timestamp)
+
+        # the landmarks and features are kept in the reused body of each track, the consumers copy what they keep
+        self.bodies = []
+        for track, landmarks in zip(tracks, bodies):
+            body_data = track.body
+            np.copyto(body_data.landmarks, landmarks)
+            if self.filter:
+                track.filter.update(body_data.landmarks, timestamp)
+            body_data.frame_width = frame.shape[1]
+            body_data.frame_height = frame.shape[0]
+            body_data.timestamp = timestamp
+            body_data.process_time = process_time
+            body_data.person_id = track.person_id
+            body_data.kinematics = track.kinematics.update(body_data.landmarks, timestamp)
+            self.bodies.append((track, body_data))
+            self.draw_body(frame, body_data)
+
+        # the most visible person is shown in the overlay and recorded
+        if self.bodies:
+            return frame, max((body for _, body in self.bodies), key=lambda body: float(np.sum(body.landmarks[:, 3])))
+        body_data = self.body_data
+        body_data.landmarks[:] = 0
+        body_data.frame_width = frame.shape[1]
+        body_data.frame_height = frame.shape[0]
+        body_data.timestamp = timestamp
+        body_data.process_time = process_time
+        body_data.kinematics = None
+        return frame, body_data
+
+    def draw_body(self, frame, body_data: BodyModel):
+        """Draws the skeleton and the id of a tracked person"""
+        color = COLORS[body_data.person_id % len(COLORS)]
+        self.draw_skeleton(frame, body_data.landmarks, color)
+        x, y = self.buffers["points"][0]
+        self.cv2.putText(frame, f"#{body_data.person_id}", (int(x), int(y) - 20), self.cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                         color, 2)
+
+    def get_body_info(self, body_data: BodyModel):
+        info_lines = super().get_body_info(body_data)
+        info_lines.insert(3, f"Persons: {len(self.bodies)}")
+        return info_lines
+
+    def send(self, body_data: BodyModel):
+        """
+        Adds the body of every tracked person to its own chunk and sends the complete chunks. The persons whose track
+        was lost get an empty detection, so the Brain notices that they left.
+        """
+        for track in self.tracker.lost:
+            for chunk in track.aggregator.flush(body_data.timestamp, track.person_id):
+                self.put(chunk, track.person_id)
+        for track, body in self.bodies:
+            chunk = track.aggregator.update(body)
+            if chunk is not None:
+                self.put(chunk, track.person_id)
+
+    def put(self, chunk: BodyModel, person_id: int):
+        try:
+            self.data_queue.put(chunk, block=False)
+            logger.debug("Quantized detection chunk of person %d sent to main process", person_id,
+                         extra={"person_id": person_id})
+        except queue.Full:
+            pass  # skip the chunk
@@ -0,0 +1,132 @@
+import time
+
+from direct.task import Task
+from panda3d.core import AntialiasAttrib, ClockObject, Texture
+
+from .log import get_logger
+from .quality import QualityController
+
+logger = get_logger(__name__)
+
+# (multisampling, render scale) from the best to the cheapest quality, the multisampled levels are only used if the
+# window was opened with a multisampled framebuffer
+RENDER_LEVELS = (
+    (True, 1.0),
+    (False, 1.0),
+    (False, 0.85),
+    (False, 0.7),
+    (False, 0.5),
+)
+
+
+class FramePacer:
+    """
+    Caps the frame rate of a ShowBase and adapts the render resolution and multisampling to hold the frame budget.
+    The clock runs in limited mode, so Panda3D sleeps away the rest of every frame instead of rendering as fast as it
+    can. The frame time stays real time, animations and intervals run at their speed no matter how many frames are
+    rendered. Below full scale the scene is rendered into a smaller offscreen buffer that is stretched over the window.
+    The pacer starts at the best level without multisampling, multisampling is only switched on once the frames leave
+    enough room in the budget.
+    """
+
+    def __init__(self, base, target_fps: float = 30, levels=RENDER_LEVELS, adaptive: bool = True,
+                 multisample: bool = False):
+        """
+        :param base: The ShowBase to pace.
+        :param target_fps: The frame rate cap, 0 to render as fast as possible.
+        :param levels: The available (multisampling, render scale) pairs, ordered from best to cheapest.
+        :param adaptive: If the render quality adapts to the frame budget, otherwise the best level is kept.
+        :param multisample: If the multisampled levels are used, the window needs to be opened with a multisampled
+            framebuffer for them.
+        """
+        self.base = base
+        self.target_fps = target_fps
+        if multisample and not base.win.getFbProperties().getMultisamples():
+            logger.warning("The window has no multisampled framebuffer, rendering without multisampling")
+            multisample = False
+        if not multisample:
+            levels = tuple(level for level in levels if not level[0])
+        self.levels = levels
+        self.level = None
+        start_level = 0 if not adaptive else next((index for index, level in enumerate(levels) if not level[0]), 0)
+
+        clock = ClockObject.getGlobalClock()
+        if target_fps:
+            clock.setMode(ClockObject.MLimited)
+            clock.setFrameRate(target_fps)
+        # the budget of an uncapped window is the common 60 Hz refresh rate
+        self.controller = QualityController(target_fps=target_fps or 60, levels=levels, start_level=start_level) \
+            if adaptive else None
+
+        # scene buffer, created when the first reduced scale is needed
+        self.buffer = None
+        self.scene_camera = None
+        self.card = None
+        self.texture = Texture("scene")
+        self.scene_size = None
+
+        self.frame_start = 0.0
+        self.apply_level(start_level)
+        if self.controller:
+            base.taskMgr.add(self.begin_frame, "pacer_begin_frame", sort=-1000)
+            base.taskMgr.add(self.end_frame, "pacer_end_frame", sort=1000)
+
+    def throttle(self, fps: float | None):
+        """Lowers the frame rate cap to save power, None restores the target frame rate"""
+        clock = ClockObject.getGlobalClock()
+        fps = fps or self.target_fps
+        if fps:
+            clock.setMode(ClockObject.MLimited)
+            clock.setFrameRate(fps)
+        else:
+            clock.setMode(ClockObject.MNormal)
+
+    def begin_frame(self, task):
+        # runs after the clock tick, so the sleep of the frame rate cap is not measured
+        self.frame_start = time.perf_counter()
+        return Task.cont
+
+    def end_frame(self, task):
+        if self.controller.update(time.perf_counter() - self.frame_start):
+            self.apply_level(self.controller.level)
+            logger.info("Render quality: multisampling %s, scale %.2f", "on" if self.levels[self.level][0] else "off",
+                        self.levels[self.level][1])
+        return Task.cont
+
+    def apply_level(self, level: int):
+        multisample, scale = self.levels[level]
+        self.level = level
+        self.base.render.setAntialias(AntialiasAttrib.MMultisample if multisample else AntialiasAttrib.MNone)
+        self.set_scale(scale)
+
+    def set_scale(self, scale: float):
+        """Renders the scene at a fraction of the window size, 1 renders straight into the window"""
+        win = self.base.win
+        if scale >= 1:
+            if self.buffer:
+                self.buffer.setActive(False)
+                self.card.hide()
+                self.base.camNode.setActive(True)
+            return
+
+        size = (max(1, int(win.getXSize() * scale)), max(1, int(win.getYSize() * scale)))
+        if self.buffer is None:
+            self.buffer = win.makeTextureBuffer("scene", size[0], size[1], self.texture)
+            self.buffer.setSort(-10)
+            self.buffer.setClearColor(win.getClearColor())
+            self.scene_camera = self.base.makeCamera(self.buffer, lens=self.base.camLens)
+        elif size != self.scene_size:
+            self.buffer.setSize(*size)
+
+        if size != self.scene_size:
+            # the card's texture coordinates depend on the padding of the buffer size
+            if self.card:
+                self.card.removeNode()
+            self.card = self.buffer.getTextureCard()
+            self.card.reparentTo(self.base.render2d)
+            self.card.setBin("background", 0)  # behind everything drawn in 2D
+            self.scene_size = size
+
+        self.buffer.setActive(True)
+        self.card.show()
+        self.base.camNode.setActive(False)
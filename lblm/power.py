@@ -0,0 +1,85 @@
+"""
+    Power states of the installation, so it does not run at full load while nobody is in front of it.
+
+        active: somebody is visible, everything runs at full rate
+        idle:   nobody was seen for a while, the camera is sampled and the scene rendered at a lower rate
+        sleep:  nobody was seen for a long time, the rates drop further and the language model is unloaded
+
+    A visible body switches back to active right away. The idle rates are chosen so that the wake up takes at most one
+    detection interval, the language model is reloaded while the first gesture is being collected.
+"""
+
+from enum import IntEnum
+from multiprocessing import Value
+
+import numpy as np
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+class PowerState(IntEnum):
+    ACTIVE = 0
+    IDLE = 1
+    SLEEP = 2
+
+
+# the frame rates of the detection and the rendering below the active state, which runs at the full rates
+DETECTION_FPS = {PowerState.IDLE: 5.0, PowerState.SLEEP: 2.0}
+RENDER_FPS = {PowerState.IDLE: 15.0, PowerState.SLEEP: 5.0}
+
+
+class PowerStateMachine:
+    """
+    The power state shared by the Detector, the Brain and the Visualizer.
+    The Detector updates it with the landmarks of every frame it processes, the state lives in a shared value so the
+    other processes only read it.
+    """
+
+    def __init__(self, idle_after: float = 10.0, sleep_after: float = 300.0, min_visibility: float = 0.5,
+                 min_landmarks: int = 8):
+        """
+        :param idle_after: The number of seconds without a visible body until the installation turns idle.
+        :param sleep_after: The number of seconds without a visible body until the installation goes to sleep.
+        :param min_visibility: The visibility a landmark needs to count as visible.
+        :param min_landmarks: The number of visible landmarks a body needs to count as present.
+        """
+        if sleep_after < idle_after:
+            raise ValueError("The sleep time must not be shorter than the idle time")
+        self.idle_after = idle_after
+        self.sleep_after = sleep_after
+        self.min_visibility = min_visibility
+        self.min_landmarks = min_landmarks
+
+        self.value = Value("b", PowerState.ACTIVE, lock=False)
+        self.last_seen: float | None = None
+
+    @property
+    def state(self) -> PowerState:
+        return PowerState(self.value.value)
+
+    def update(self, landmarks: np.ndarray, timestamp: float) -> PowerState:
+        """
+        Updates the state with the landmarks of a frame.
+        :param landmarks: The (33, 4) landmarks of the most visible body, zeros if there is none.
+        :param timestamp: The time of the frame in seconds.
+        :return: The new state.
+        """
+        if self.last_seen is None:
+            self.last_seen = timestamp
+
+        if np.count_nonzero(landmarks[:, 3] > self.min_visibility) >= self.min_landmarks:
+            self.last_seen = timestamp
+            state = PowerState.ACTIVE
+        elif timestamp - self.last_seen >= self.sleep_after:
+            state = PowerState.SLEEP
+        elif timestamp - self.last_seen >= self.idle_after:
+            state = PowerState.IDLE
+        else:
+            state = self.state
+
+        if state != self.value.value:
+            self.value.value = state
+            logger.info("Power state: %s", state.name.lower())
+        return state
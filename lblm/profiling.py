@@ -0,0 +1,162 @@
+"""
+    Opt-in profiling of the Detector, the Brain and the Visualizer, enabled with `python -m lblm --profile <dir>`.
+    Every component samples the stack of its own thread from a background thread and times its hot sections. The
+    samples are written as folded stacks, one `root;caller;function count` line per stack, which flamegraph.pl and
+    speedscope read directly. The section timers are written next to them as JSON:
+
+        <dir>/<component>.folded
+        <dir>/<component>.sections.json
+
+    The files are written when the component stops and whenever the process receives SIGUSR1, e.g. with
+    `kill -USR1 <pid>`. The sampling only reads the stack of the thread, so the real time loops keep their timing.
+"""
+
+import atexit
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# the profilers of this process, they are all written on SIGUSR1
+_profilers: list["Profiler"] = []
+
+
+def dump_all(signum=None, frame=None):
+    """Writes the output of all profilers of this process, also the signal handler"""
+    for profiler in _profilers:
+        # forked processes inherit the profilers started before the fork
+        if profiler.pid == os.getpid():
+            profiler.dump()
+
+
+def install_signal_handler():
+    """Writes the profiles on SIGUSR1, needs to be called from the main thread of the process"""
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, dump_all)
+
+
+class Profiler:
+    """Samples the stack of the thread that starts it and times instrumented functions"""
+
+    def __init__(self, component: str, directory: str, interval: float = 0.01):
+        """
+        :param component: The name of the component, used for the file names.
+        :param directory: The folder the output is written to.
+        :param interval: The number of seconds between two samples.
+        """
+        self.component = component
+        self.directory = directory
+        self.interval = interval
+
+        self.samples: dict[tuple, int] = {}  # stacks of code objects from the leaf to the root
+        self.sections: dict[str, list] = {}  # name -> [count, total seconds, max seconds]
+        self.thread_id: int | None = None
+        self.pid: int | None = None
+        self.started = 0.0
+        self._stop = threading.Event()
+        self._lock = threading.RLock()  # the signal handler can interrupt a dump of the same thread
+        self._sampler: threading.Thread | None = None
+
+    def start(self):
+        """Starts sampling the calling thread"""
+        self.thread_id = threading.get_ident()
+        self.pid = os.getpid()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name=f"{self.component}-profiler", daemon=True)
+        self._sampler.start()
+        _profilers.append(self)
+        install_signal_handler()
+        atexit.register(self.stop)
+        logger.info("Profiling %s in process %d, dump with kill -USR1 %d", self.component, self.pid, self.pid)
+
+    def stop(self):
+        """Stops sampling and writes the output"""
+        if self._sampler is None or self.pid != os.getpid():
+            return
+        self._stop.set()
+        if self._sampler is not threading.current_thread():
+            self._sampler.join()
+        self._sampler = None
+        self.dump()
+
+    def _sample(self):
+        samples = self.samples
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            key = tuple(stack)
+            with self._lock:
+                samples[key] = samples.get(key, 0) + 1
+
+    def instrument(self, owner, name: str):
+        """
+        Times every call of a function from now on, the function is replaced by a wrapper.
+        :param owner: The instance or class the function is an attribute of.
+        :param name: The name of the function, also the name of the section.
+        """
+        function = getattr(owner, name)
+        section = self.sections.setdefault(name, [0, 0.0, 0.0])
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                section[0] += 1
+                section[1] += elapsed
+                if elapsed > section[2]:
+                    section[2] = elapsed
+
+        setattr(owner, name, timed)
+
+    @staticmethod
+    def frame_name(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def dump(self):
+        """Writes the folded stacks and the section timers sampled so far"""
+        with self._lock:
+            samples = list(self.samples.items())
+        os.makedirs(self.directory, exist_ok=True)
+
+        names: dict = {}
+        lines = []
+        for stack, count in samples:
+            frames = [names.get(code) or names.setdefault(code, self.frame_name(code)) for code in reversed(stack)]
+            lines.append(f"{';'.join(frames)} {count}")
+        with open(os.path.join(self.directory, f"{self.component}.folded"), "w") as file:
+            file.write("\n".join(sorted(lines)) + "\n")
+
+        sections = {
+            name: {
+                "count": count,
+                "total_ms": total * 1000,
+                "mean_ms": total / count * 1000 if count else 0.0,
+                "max_ms": longest * 1000,
+            }
+            for name, (count, total, longest) in self.sections.items()
+        }
+        with open(os.path.join(self.directory, f"{self.component}.sections.json"), "w") as file:
+            json.dump({
+                "component": self.component,
+                "pid": self.pid,
+                "duration_s": time.perf_counter() - self.started,
+                "interval_s": self.interval,
+                "samples": sum(count for _, count in samples),
+                "sections": sections,
+            }, file, indent=2)
+        logger.info("Profile of %s written to %s", self.component, self.directory)
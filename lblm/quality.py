@@ -0,0 +1,98 @@
+import time
+
+# (model complexity, input scale) from the best to the cheapest quality
+QUALITY_LEVELS = (
+    (2, 1.0),
+    (1, 1.0),
+    (1, 0.75),
+    (0, 0.75),
+    (0, 0.5),
+)
+
+
+class QualityController:
+    """
+    Adapts the model complexity and the input scale of the pose detection to hold a target frame rate.
+    The processing time per frame is smoothed exponentially. If it stays above the frame budget the quality is lowered,
+    if it stays well below the budget the quality is raised again. Levels that failed to hold the budget before are
+    retried with an increasing back off, so the controller settles instead of oscillating.
+    """
+
+    def __init__(self, target_fps: float = 25, levels=QUALITY_LEVELS, start_level: int = 1, smoothing: float = 0.1,
+                 patience: int = 30, cooldown: float = 2.0, upgrade_ratio: float = 0.45):
+        """
+        :param target_fps: The frame rate to hold.
+        :param levels: The available (model complexity, input scale) pairs, ordered from best to cheapest.
+        :param start_level: The index of the level to start with.
+        :param smoothing: The weight of a new sample in the moving average of the processing time.
+        :param patience: The number of consecutive frames outside the budget before the level changes.
+        :param cooldown: The minimum number of seconds between two level changes.
+        :param upgrade_ratio: The fraction of the budget the processing time needs to be below to raise the quality.
+        """
+        self.budget = 1 / target_fps
+        self.levels = levels
+        self.level = start_level
+        self.smoothing = smoothing
+        self.patience = patience
+        self.cooldown = cooldown
+        self.upgrade_ratio = upgrade_ratio
+
+        self.average: float | None = None
+        self.over_budget = 0
+        self.under_budget = 0
+        self.last_change = time.time()
+
+        # back off for levels that could not hold the budget
+        self.failures = [0] * len(levels)
+        self.blocked_until = [0.0] * len(levels)
+
+    @property
+    def complexity(self) -> int:
+        return self.levels[self.level][0]
+
+    @property
+    def scale(self) -> float:
+        return self.levels[self.level][1]
+
+    def update(self, process_time: float) -> bool:
+        """
+        Adds the processing time of a frame.
+        :param process_time: The time it took to process the frame in seconds.
+        :return: If the quality level changed.
+        """
+        if self.average is None:
+            self.average = process_time
+        else:
+            self.average += self.smoothing * (process_time - self.average)
+
+        if self.average > self.budget:
+            self.over_budget += 1
+            self.under_budget = 0
+        elif self.average < self.budget * self.upgrade_ratio:
+            self.under_budget += 1
+            self.over_budget = 0
+        else:
+            self.over_budget = 0
+            self.under_budget = 0
+
+        now = time.time()
+        if now - self.last_change < self.cooldown:
+            return False
+
+        if self.over_budget >= self.patience and self.level < len(self.levels) - 1:
+            self.failures[self.level] += 1
+            self.blocked_until[self.level] = now + self.cooldown * 2 ** self.failures[self.level]
+            return self._set_level(self.level + 1, now)
+
+        if self.under_budget >= self.patience and self.level > 0 and now >= self.blocked_until[self.level - 1]:
+            return self._set_level(self.level - 1, now)
+
+        return False
+
+    def _set_level(self, level: int, now: float) -> bool:
+        self.level = level
+        self.last_change = now
+        self.average = None  # measure the new level from scratch
+        self.over_budget = 0
+        self.under_budget = 0
+        return True
@@ -0,0 +1,230 @@
+"""
+    Recording and replaying of landmark sessions.
+    A recording is a header followed by fixed size chunks, so the whole file can be memory mapped as one structured
+    numpy array without parsing it:
+
+        header: magic (8 bytes), version, frames per chunk, landmarks per frame, values per landmark (uint32 each)
+        chunk:  frame count (uint32), padding (uint32), timestamps (float64[frames]), landmarks (float32[frames, 33, 4])
+
+    Only the last chunk of a file can be partially filled.
+"""
+
+import os
+import struct
+import time
+from multiprocessing import Process, Queue, Event
+
+import numpy as np
+
+from .aggregation import ChunkAggregator
+from .detection import BodyModel
+from .kinematics import KinematicFeatures
+from .log import attach, current_level, current_queue, get_logger
+from .segmenter import GestureSegmenter
+
+logger = get_logger(__name__)
+
+MAGIC = b"LBLMREC\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII")
+HEADER_SIZE = 64  # the header is padded to keep the chunks aligned
+
+N_LANDMARKS = 33
+N_VALUES = 4
+
+
+def chunk_dtype(chunk_frames: int) -> np.dtype:
+    """
+    The structured dtype of one chunk in a recording.
+    :param chunk_frames: The number of frames per chunk.
+    """
+    return np.dtype([
+        ("count", "<u4"),
+        ("padding", "<u4"),
+        ("timestamps", "<f8", (chunk_frames,)),
+        ("landmarks", "<f4", (chunk_frames, N_LANDMARKS, N_VALUES)),
+    ])
+
+
+class LandmarkRecorder:
+    """Appends per-frame landmarks with their timestamps to a recording file"""
+
+    def __init__(self, path: str, chunk_frames: int = 256):
+        """
+        :param path: The file to write to. An existing file will be overwritten.
+        :param chunk_frames: The number of frames buffered in memory before they are written to disk.
+        """
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.frame_count = 0
+
+        self._chunk = np.zeros((), dtype=chunk_dtype(chunk_frames))
+        self._file = open(path, "wb")
+        header = HEADER.pack(MAGIC, VERSION, chunk_frames, N_LANDMARKS, N_VALUES)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def write(self, landmarks: np.ndarray, timestamp: float):
+        """
+        Adds a frame to the recording.
+        :param landmarks: The (33, 4) landmarks of the frame.
+        :param timestamp: The time the frame was captured in seconds.
+        """
+        index = int(self._chunk["count"])
+        self._chunk["timestamps"][index] = timestamp
+        self._chunk["landmarks"][index] = landmarks
+        self._chunk["count"] = index + 1
+        self.frame_count += 1
+
+        if index + 1 == self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered chunk to disk, even if it is only partially filled."""
+        if self._chunk["count"] == 0:
+            return
+        self._file.write(self._chunk.tobytes())
+        self._file.flush()
+        self._chunk.fill(0)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class LandmarkRecording:
+    """Memory mapped read access to a recording file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            magic, version, chunk_frames, n_landmarks, n_values = HEADER.unpack(file.read(HEADER.size))
+
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a landmark recording")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recording version {version} in {path}")
+        if (n_landmarks, n_values) != (N_LANDMARKS, N_VALUES):
+            raise ValueError(f"Unsupported landmark layout {n_landmarks}x{n_values} in {path}")
+
+        self.path = path
+        self.chunk_frames = chunk_frames
+
+        dtype = chunk_dtype(chunk_frames)
+        chunk_amount = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        if chunk_amount > 0:
+            self.chunks = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(chunk_amount,))
+            self.frame_count = int(np.sum(self.chunks["count"], dtype=np.int64))
+        else:
+            self.chunks = np.zeros(0, dtype=dtype)
+            self.frame_count = 0
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index: int) -> tuple[float, np.ndarray]:
+        """
+        :param index: The index of the frame in the recording.
+        :return: The timestamp and a read only view of the (33, 4) landmarks of the frame.
+        """
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range for {self.frame_count} frames")
+        chunk, offset = divmod(index, self.chunk_frames)
+        return float(self.chunks["timestamps"][chunk, offset]), self.chunks["landmarks"][chunk, offset]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            count = int(chunk["count"])
+            for offset in range(count):
+                yield float(chunk["timestamps"][offset]), chunk["landmarks"][offset]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """The timestamps of all frames as one array."""
+        return np.concatenate([chunk["timestamps"][:chunk["count"]] for chunk in self.chunks]) \
+            if self.frame_count else np.zeros(0, dtype=np.float64)
+
+
+class LandmarkReplayer(Process):
+    """
+    Feeds a recording into a data queue as if it was the live detector.
+    Stands in for the Detector, the frames are quantized into chunks the same way.
+    """
+
+    def __init__(self, path: str, data_queue: Queue, stop_event: Event, speed: float = 1.0, loop: bool = False,
+                 chunk_length: float = 6, segment_gestures: bool = False):
+        """
+        :param path: The recording to replay.
+        :param data_queue: The queue the chunks are put into, usually the input queue of the Brain.
+        :param stop_event: Stops the replay when set.
+        :param speed: The replay speed relative to real time. Values <= 0 replay as fast as possible.
+        :param loop: If the recording should start over when it is finished.
+        :param chunk_length: The length of the quantization chunks in seconds.
+        :param segment_gestures: If a detection is sent at the end of every gesture instead of every chunk.
+        """
+        super().__init__()
+        self.path = path
+        self.data_queue = data_queue
+        self.stop_event = stop_event
+        self.speed = speed
+        self.loop = loop
+        self.chunk_length = chunk_length
+        self.segment_gestures = segment_gestures
+        self.log_queue = current_queue()
+        self.log_level = current_level()
+
+    def run(self):
+        attach(self.log_queue, self.log_level)
+
+        recording = LandmarkRecording(self.path)
+        logger.info("Replaying %d frames from %s at %sx speed", len(recording), self.path, self.speed)
+        if len(recording) == 0:
+            return
+
+        aggregator = GestureSegmenter() if self.segment_gestures else ChunkAggregator(chunk_length=self.chunk_length)
+        kinematics = KinematicFeatures()
+        time_offset = 0.0  # keeps the timestamps increasing when looping
+        first_timestamp = recording.frame(0)[0]
+
+        while not self.stop_event.is_set():
+            replay_start = time.time()
+            last_timestamp = first_timestamp
+
+            for timestamp, landmarks in recording:
+                if self.stop_event.is_set():
+                    break
+
+                if self.speed > 0:
+                    delay = replay_start + (timestamp - first_timestamp) / self.speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                body_data = BodyModel(landmarks=np.array(landmarks), timestamp=timestamp + time_offset)
+                if np.any(body_data.landmarks):
+                    body_data.kinematics = kinematics.update(body_data.landmarks, body_data.timestamp).copy()
+                else:
+                    kinematics.reset()
+                chunk = aggregator.update(body_data)
+                if chunk is not None:
+                    self.put(chunk)
+                last_timestamp = timestamp
+
+            if not self.loop:
+                break
+            time_offset += last_timestamp - first_timestamp
+        # the replayed visitor leaves with the end of the recording
+        for chunk in aggregator.flush(last_timestamp + time_offset):
+            self.put(chunk)
+        logger.info("Replay finished")
+
+    def put(self, chunk):
+        try:
+            self.data_queue.put(chunk, block=False)
+        except Exception:
+            pass  # Queue full, skip
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class RoiTracker:
+    """
+    Tracks the region of the frame the body is in, so only that region has to be processed.
+    The region is the bounding box of the visible landmarks of the last frame plus a margin. It is kept stable as long
+    as the body stays well inside of it, which keeps the crop size constant for the reused buffers and the internal
+    tracking of MediaPipe. If too few landmarks are visible, the tracking is lost and the full frame is used.
+    """
+
+    def __init__(self, margin: float = 0.3, min_visibility: float = 0.5, min_landmarks: int = 8,
+                 min_size: float = 0.25, step: int = 64):
+        """
+        :param margin: The margin around the bounding box, relative to its size.
+        :param min_visibility: The visibility a landmark needs to count for the bounding box.
+        :param min_landmarks: The number of visible landmarks needed to keep tracking.
+        :param min_size: The minimum size of the region relative to the frame.
+        :param step: The region size is rounded up to multiples of this many pixels.
+        """
+        self.margin = margin
+        self.min_visibility = min_visibility
+        self.min_landmarks = min_landmarks
+        self.min_size = min_size
+        self.step = step
+
+        # the current region as normalized (x0, y0, x1, y1) of the full frame, None for the full frame
+        self.region: tuple[float, float, float, float] | None = None
+
+    def reset(self):
+        self.region = None
+
+    def crop(self, frame: np.ndarray) -> tuple[np.ndarray, tuple[int, int, int, int] | None]:
+        """
+        :param frame: The full frame.
+        :return: A view of the region of the frame and the region in pixels as (x, y, width, height),
+            or the full frame and None if there is no region.
+        """
+        if self.region is None:
+            return frame, None
+
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.region
+        crop_width = min(width, -(-round((x1 - x0) * width) // self.step) * self.step)
+        crop_height = min(height, -(-round((y1 - y0) * height) // self.step) * self.step)
+        x = min(max(0, round(x0 * width)), width - crop_width)
+        y = min(max(0, round(y0 * height)), height - crop_height)
+        return frame[y:y + crop_height, x:x + crop_width], (x, y, crop_width, crop_height)
+
+    @staticmethod
+    def to_frame(landmarks: np.ndarray, pixels: tuple[int, int, int, int] | None, frame_width: int,
+                 frame_height: int):
+        """
+        Maps landmarks detected in a cropped region back to normalized coordinates of the full frame, in place.
+        :param landmarks: The (33, 4) landmarks normalized to the region.
+        :param pixels: The region in pixels as returned by crop.
+        """
+        if pixels is None:
+            return
+        x, y, width, height = pixels
+        landmarks[:, 0] *= width / frame_width
+        landmarks[:, 0] += x / frame_width
+        landmarks[:, 1] *= height / frame_height
+        landmarks[:, 1] += y / frame_height
+        landmarks[:, 2] *= width / frame_width  # the depth has the scale of the x coordinate
+
+    def update(self, landmarks: np.ndarray):
+        """
+        Updates the region with the landmarks of the last frame.
+        :param landmarks: The (33, 4) landmarks normalized to the full frame.
+        """
+        visible = landmarks[landmarks[:, 3] > self.min_visibility]
+        if len(visible) < self.min_landmarks:
+            self.region = None
+            return
+
+        x0, y0 = np.min(visible[:, :2], axis=0)
+        x1, y1 = np.max(visible[:, :2], axis=0)
+
+        if self.region is not None:
+            rx0, ry0, rx1, ry1 = self.region
+            # keep the region while the body is inside of it with some margin left and it is not far too large
+            inner_x = (rx1 - rx0) * self.margin / (1 + 2 * self.margin) / 2
+            inner_y = (ry1 - ry0) * self.margin / (1 + 2 * self.margin) / 2
+            inside = x0 > rx0 + inner_x and x1 < rx1 - inner_x and y0 > ry0 + inner_y and y1 < ry1 - inner_y
+            too_large = (x1 - x0) * (y1 - y0) * 4 < (rx1 - rx0) * (ry1 - ry0)
+            if inside and not too_large:
+                return
+
+        half_width = max((x1 - x0) * (1 + 2 * self.margin), self.min_size) / 2
+        half_height = max((y1 - y0) * (1 + 2 * self.margin), self.min_size) / 2
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        region = (max(0.0, center_x - half_width), max(0.0, center_y - half_height),
+                  min(1.0, center_x + half_width), min(1.0, center_y + half_height))
+
+        # no need to crop if the region covers most of the frame anyway
+        if (region[2] - region[0]) * (region[3] - region[1]) > 0.8:
+            self.region = None
+        else:
+            self.region = tuple(float(value) for value in region)
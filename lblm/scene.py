@@ -0,0 +1,355 @@
+import time
+from multiprocessing.synchronize import Event
+
+from panda3d.core import loadPrcFileData, Shader, ShaderAttrib
+loadPrcFileData('', 'basic-shaders-only #f')  # Allow custom shaders
+
+from direct.showbase.ShowBase import ShowBase
+from panda3d.core import AmbientLight, DirectionalLight, Vec4
+from direct.actor.Actor import Actor
+from direct.task import Task
+from direct.interval.LerpInterval import LerpFunc
+from direct.interval.IntervalGlobal import Sequence, Func
+from multiprocessing import Queue
+import sys
+from collections import OrderedDict, deque
+from math import radians, tan
+from queue import Empty
+
+from panda3d.core import GeomVertexArrayFormat, GeomVertexFormat, GeomVertexData, Geom, GeomNode, GeomTriangles
+import numpy as np
+
+from .catalog import AnimationCatalog
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+def apply_shader(actor: Actor, light: bool = False, hardware_skinning: bool = True) -> bool:
+    """
+    Applies the gradient shader of the light or dark mode to the actor.
+    With hardware skinning the vertex shader gets the joint matrices and deforms the mesh on the GPU, otherwise Panda3D
+    animates every vertex on the CPU before each frame.
+    :return: If the shader could be loaded.
+    """
+    vertex = "lblm/shader/gradient_skinned.vert" if hardware_skinning else "lblm/shader/gradient.vert"
+    fragment = "lblm/shader/light/gradient.frag" if light else "lblm/shader/dark/gradient.frag"
+    shader = Shader.load(Shader.SL_GLSL, vertex, fragment)
+    if not shader:
+        return False
+    attrib = ShaderAttrib.make(shader)
+    if hardware_skinning:
+        attrib = attrib.setFlag(ShaderAttrib.F_hardware_skinning, True)
+    actor.setAttrib(attrib)
+    return True
+
+
+class Ring3D:
+    """
+    A flat ring that fills up as a progress indicator.
+    The geometry is built once from NumPy arrays and copied into the vertex and index buffers in bulk. The progress is
+    computed by the shader from the frame time, so an animating ring costs nothing on the CPU.
+    """
+
+    def __init__(self, parent, radius=1.0, segments=64, color=(1.0, 1.0, 1.0, 1.0), thickness=0.05,
+                 track_color=(0.3, 0.3, 0.3, 1.0)):
+        self.radius = radius
+        self.segments = segments
+        self.color = color
+        self.track_color = track_color
+        self.thickness = thickness
+        self.node = parent.attachNewNode("ring")
+        self.ring_geom_node = GeomNode("ring_geom")
+        self.node.attachNewNode(self.ring_geom_node)
+        self.is_visible = True
+        self._create_ring()
+
+        self.node.setShader(Shader.load(Shader.SL_GLSL, "lblm/shader/ring.vert", "lblm/shader/ring.frag"))
+        self.node.setShaderInput("fill_color", Vec4(*self.color))
+        self.node.setShaderInput("track_color", Vec4(*self.track_color))
+        self.node.setShaderInput("progress_start", 0.0)
+        self.node.setShaderInput("progress_duration", 0.0)
+
+    def update(self, visible: bool):
+        self.is_visible = visible
+        if visible:
+            self.node.show()
+        else:
+            self.node.hide()
+
+    def start_progress(self, duration: float):
+        """Lets the ring fill up over the duration in seconds, starting now"""
+        self.node.setShaderInput("progress_start", globalClock.getFrameTime())
+        self.node.setShaderInput("progress_duration", float(duration))
+
+    def _create_ring(self):
+        array_format = GeomVertexArrayFormat()
+        array_format.addColumn("vertex", 3, Geom.NT_float32, Geom.C_point)
+        array_format.addColumn("fraction", 1, Geom.NT_float32, Geom.C_other)
+        format = GeomVertexFormat.registerFormat(GeomVertexFormat(array_format))
+
+        # inner and outer vertex of every step around the ring, the seam is duplicated to get the fraction 1
+        fractions = np.linspace(0.0, 1.0, self.segments + 1, dtype=np.float32)
+        radii = np.array([self.radius - self.thickness / 2, self.radius + self.thickness / 2], dtype=np.float32)
+        vertices = np.zeros((self.segments + 1, 2, 4), dtype=np.float32)
+        vertices[:, :, 0] = np.cos(2 * np.pi * fractions)[:, None] * radii
+        vertices[:, :, 1] = np.sin(2 * np.pi * fractions)[:, None] * radii
+        vertices[:, :, 3] = fractions[:, None]
+
+        # two triangles per segment: inner[i], outer[i], inner[i + 1] and inner[i + 1], outer[i], outer[i + 1]
+        inner = np.arange(self.segments, dtype=np.uint32) * 2
+        indices = np.stack([inner, inner + 1, inner + 2, inner + 2, inner + 1, inner + 3], axis=1)
+
+        vdata = GeomVertexData("vertices", format, Geom.UHStatic)
+        vdata.uncleanSetNumRows(len(vertices) * 2)
+        memoryview(vdata.modifyArray(0)).cast("B")[:] = vertices.tobytes()
+
+        tris = GeomTriangles(Geom.UHStatic)
+        tris.setIndexType(Geom.NT_uint32)
+        index_array = tris.modifyVertices()
+        index_array.uncleanSetNumRows(indices.size)
+        memoryview(index_array).cast("B")[:] = indices.tobytes()
+
+        geom = Geom(vdata)
+        geom.addPrimitive(tris)
+        self.ring_geom_node.addGeom(geom)
+
+
+class _Visualizer(ShowBase):
+    def __init__(self, catalog: AnimationCatalog, queue: Queue, is_outputting_event: Event, actor_path="lblm/data/character.glb", light: bool = False,loop: bool = False, hardware_skinning: bool = True, avatars: int = 1):
+        try:
+            ShowBase.__init__(self)
+            self.queue = queue
+            self.is_outputting_event = is_outputting_event
+            self.loop = loop
+            self.hardware_skinning = hardware_skinning
+
+            # init the animations and the base animation
+            self.current_anim_index = 0
+
+            # the state of every avatar slot, the slot of a person is reassigned when it was not seen for the longest
+            self.avatars = avatars
+            self.slot_anims = [0] * avatars  # the current animation index of every slot
+            self.pending = [deque() for _ in range(avatars)]  # the animations waiting for every slot
+            self.outputting = [False] * avatars
+            self.person_slots: OrderedDict[int, int] = OrderedDict()
+            logger.info("Available animations: %d", len(catalog))
+
+            self.disableMouse()
+            if light:
+                self.set_background_color(1, 1, 1, 1)
+            else:
+                self.set_background_color(0, 0, 0, 1)
+
+            self.catalog = catalog
+            self.animations = catalog.animations
+
+            # animations
+            if light:
+                self.ring = Ring3D(self.render, color=(0.2, 0.2, 0.2, 1.0), track_color=(0.8, 0.8, 0.8, 1.0))
+            else:
+                self.ring = Ring3D(self.render)
+            self.pie_duration = 8.0  # seconds for full animation
+            self.taskMgr.add(self.update_animations, "update_animations")
+            self.animating = False
+
+            self.animation_length = 0
+            self.animation_start = 0
+
+            self.setup_scene(actor_path, light)
+
+        except Exception:
+            logger.exception("Error initializing visualizer")
+            sys.exit(1)
+
+    def setup_scene(self, actor_path: str, light: bool):
+        """Loads the rigged character with its shader, the lights and the camera"""
+        # Load GLB model with rig
+        self.actor = Actor(actor_path, self.animations)
+        self.actor.setScale(1)
+        self.actor.setPos(0, 0, 0)
+        bounds = self.actor.getTightBounds()
+
+        # further avatars are copies sharing the geometry and the loaded animations, each with its own animation state
+        self.stage = self.render.attachNewNode("avatars")
+        self.actors = [self.actor] + [Actor(other=self.actor) for _ in range(self.avatars - 1)]
+        for actor in self.actors:
+            actor.reparentTo(self.stage)
+        if self.avatars > 1 and bounds:
+            self.arrange_avatars(bounds)
+
+        # Load and apply the shader
+        try:
+            for actor in self.actors:
+                if not apply_shader(actor, light, self.hardware_skinning):
+                    logger.warning("Could not load shader")
+                    break
+        except Exception as e:
+            logger.warning("Shader loading failed: %s", e)
+
+        # Lights
+        alight = AmbientLight("ambient")
+        alight.setColor(Vec4(0.5, 0.5, 0.5, 1))
+        alnp = self.render.attachNewNode(alight)
+        self.render.setLight(alnp)
+
+        dlight = DirectionalLight("dlight")
+        dlight.setColor(Vec4(0.8, 0.8, 0.8, 1))
+        dlnp = self.render.attachNewNode(dlight)
+        dlnp.setHpr(0, -60, 0)
+        self.render.setLight(dlnp)
+
+        # Camera (frontal, centered)
+        if bounds:
+            center = (bounds[0] + bounds[1]) * 0.5
+            cam_dist = 2.2  # How far in front of the model
+            self.camera.setPos(center.getX(), center.getY() - cam_dist, center.getZ())
+            self.camera.lookAt(center)
+        else:
+            logger.warning("Could not get actor bounds, using default camera position")
+            self.camera.setPos(0, -5, 0)
+            self.camera.lookAt(0, 0, 0)
+
+    def arrange_avatars(self, bounds):
+        """Places the avatars next to each other and scales them down to fit the view of the camera"""
+        width = bounds[1].getX() - bounds[0].getX()
+        spacing = width * 1.3
+        for slot, actor in enumerate(self.actors):
+            actor.setX((slot - (self.avatars - 1) / 2) * spacing)
+
+        # the camera keeps its distance, the depth gradient of the shader depends on it
+        center = (bounds[0] + bounds[1]) * 0.5
+        visible_width = 2 * 2.2 * tan(radians(self.camLens.getFov()[0]) / 2)
+        scale = min(1.0, visible_width / (spacing * self.avatars))
+        self.stage.setScale(scale)
+        self.stage.setPos(center * (1 - scale))  # scale around the center of the character
+
+    def slot_of(self, person_id: int) -> int:
+        """The avatar slot answering the person, a new person takes over the slot of the least recently seen one"""
+        if self.avatars == 1:
+            return 0
+        slot = self.person_slots.get(person_id)
+        if slot is None:
+            used = set(self.person_slots.values())
+            free = [slot for slot in range(self.avatars) if slot not in used]
+            if free:
+                slot = free[0]
+            else:
+                _, slot = self.person_slots.popitem(last=False)
+            self.person_slots[person_id] = slot
+        else:
+            self.person_slots.move_to_end(person_id)
+        return slot
+
+    def collect_outputs(self):
+        """Moves the animations of the queue to the slots they are meant for"""
+        while not self.queue.empty():
+            try:
+                value = self.queue.get(block=False)
+            except Empty:
+                break
+            if isinstance(value, tuple):
+                person_id, value = value
+                self.pending[self.slot_of(person_id)].append(value)
+            else:
+                self.pending[0].append(value)
+
+    def play(self, anim: str, slot: int = 0):
+        """Loops an animation without a transition"""
+        self.actors[slot].loop(anim)
+
+    def crossfade(self, from_anim: str, to_anim: str, duration: float = 1.0, slot: int = 0):
+        """Blends from one looping animation to another"""
+        actor = self.actors[slot]
+        actor.enableBlend()  # Enable animation blending
+        actor.loop(from_anim)
+        actor.loop(to_anim)
+
+        actor.setControlEffect(from_anim, 1.0)
+        actor.setControlEffect(to_anim, 0.0)
+
+        # Create a crossfade by interpolating weights
+        def set_blend(t):
+            actor.setControlEffect(from_anim, 1.0 - t)
+            actor.setControlEffect(to_anim, t)
+
+        # once faded, only the new animation is evaluated again
+        def finish_blend():
+            if from_anim != to_anim:
+                actor.stop(from_anim)
+            actor.disableBlend()
+
+        Sequence(LerpFunc(set_blend, fromData=0.0, toData=1.0, duration=duration), Func(finish_blend)).start()
+
+    def loop_task(self, task: Task):
+        """
+        Just loops through the animations
+        """
+        new_animation = self.catalog.names[self.current_anim_index]
+        for slot in range(self.avatars):
+            self.play(new_animation, slot)
+        logger.info("Playing animation %d/%d", self.current_anim_index, len(self.catalog))
+        duration = float(self.catalog.durations[self.current_anim_index])
+        self.current_anim_index = (self.current_anim_index + 1) % len(self.catalog)
+        self.taskMgr.doMethodLater(duration, self.loop_task, "LoopTask")
+        return Task.done
+
+
+    def animate_task(self, slot: int, task: Task):
+        try:
+            from_anim = self.catalog.names[self.slot_anims[slot]]
+
+            self.collect_outputs()
+            value = self.pending[slot].popleft() if self.pending[slot] else None
+            to_anim_index = self.catalog.ids.get(value, 0) if value else 0
+            self.outputting[slot] = bool(to_anim_index)
+            if any(self.outputting):
+                self.is_outputting_event.set()
+            else:
+                self.is_outputting_event.clear()
+
+            to_anim = self.catalog.names[to_anim_index]
+            self.slot_anims[slot] = to_anim_index
+
+            # Crossfade over 1 second
+            self.crossfade(from_anim, to_anim, duration=1.0, slot=slot)
+
+            # get the length of the current animation
+            if to_anim_index == 0:
+                anim_length = 2
+            else:
+                anim_length = min(float(self.catalog.durations[to_anim_index]), 8)
+
+            if to_anim_index:
+                self.ring.start_progress(anim_length)
+
+            # Schedule next transition after animation length
+            self.animation_length = anim_length
+            self.animation_start = time.time()
+            self.taskMgr.doMethodLater(anim_length, self.animate_task, f"AnimateTask{slot}", extraArgs=[slot],
+                                       appendTask=True)
+            return Task.done
+        except Exception:
+            logger.exception("Error in animate task")
+            return Task.done
+
+    def start(self):
+        try:
+            # Schedule animation switching immediately
+            if self.loop:
+                self.taskMgr.doMethodLater(0, self.loop_task, "LoopTask")
+            else:
+                for slot in range(self.avatars):
+                    self.taskMgr.doMethodLater(0, self.animate_task, f"AnimateTask{slot}", extraArgs=[slot],
+                                               appendTask=True)
+            # Start the main loop
+            self.run()
+        except Exception:
+            logger.exception("Error starting visualizer")
+
+    def update_animations(self, task):
+        # the ring is shown while the Brain is responding, the scene graph is only touched when that changes
+        outputting = self.is_outputting_event.is_set()
+        if outputting != self.ring.is_visible:
+            self.ring.update(outputting)
+        return Task.cont
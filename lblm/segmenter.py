@@ -0,0 +1,159 @@
+import copy
+
+import numpy as np
+
+from .detection import BodyModel
+from .kinematics import KinematicFeatures, MOTION_ENERGY
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+class GestureSegmenter:
+    """
+    Cuts the landmark stream into gestures instead of fixed windows.
+    A gesture starts when the motion energy rises above the start threshold and ends once it stayed below the lower
+    end threshold for the hold time. The averaged segment is emitted right at the end of the gesture. Gestures shorter
+    than the minimum duration are discarded as twitches, gestures longer than the maximum duration are emitted in parts.
+    Drop-in replacement for the ChunkAggregator, the durations are measured on the frame timestamps as well.
+    When the visitor leaves, an empty detection is emitted like the ChunkAggregator does for the frames without a body,
+    so the Brain notices that nobody is there. A gesture cut off by the leaving is emitted first and the empty detection
+    with the next frame.
+    """
+
+    def __init__(self, start_threshold: float = 0.5, end_threshold: float = 0.2, end_hold: float = 0.3,
+                 min_duration: float = 0.5, max_duration: float = 6.0):
+        """
+        :param start_threshold: The motion energy in (rad/s)^2 that starts a gesture.
+        :param end_threshold: The motion energy below which a gesture comes to an end.
+        :param end_hold: The number of seconds the energy has to stay below the end threshold to end the gesture.
+        :param min_duration: The minimum length of a gesture in seconds.
+        :param max_duration: The maximum length of a segment in seconds.
+        """
+        if end_threshold > start_threshold:
+            raise ValueError("The end threshold must not be higher than the start threshold")
+        self.start_threshold = start_threshold
+        self.end_threshold = end_threshold
+        self.end_hold = end_hold
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+
+        # used for frames that come without kinematic features
+        self.kinematics = KinematicFeatures()
+
+        self.moving = False
+        self.start = 0.0
+        self.quiet_since: float | None = None
+        self.amount = 0
+        self.chunk = None
+        self.reset()
+
+        self.present = False  # if the last frame had a body
+        self.departure = None  # the empty detection of a departure, waiting behind a cut off gesture
+
+    def reset(self):
+        self.moving = False
+        self.start = 0.0
+        self.quiet_since = None
+        self.amount = 0
+        self.chunk = None
+
+    def update(self, body_data):
+        """
+        Adds a frame.
+        :param body_data: The detected body of the current frame.
+        :return: The averaged segment if a gesture just ended, otherwise None.
+        """
+        if not np.any(body_data.landmarks):
+            self.kinematics.reset()
+            if self.present:
+                # the visitor left, a gesture in progress ends here
+                self.present = False
+                self.departure = BodyModel(frame_width=body_data.frame_width, frame_height=body_data.frame_height,
+                                           timestamp=body_data.timestamp, person_id=body_data.person_id)
+                segment = self._finish(body_data.timestamp)
+                if segment is not None:
+                    return segment
+            departure, self.departure = self.departure, None
+            return departure
+
+        # a visitor that is back right after a cut off gesture did not leave
+        self.present = True
+        self.departure = None
+
+        features = body_data.kinematics
+        if features is None:
+            features = self.kinematics.update(body_data.landmarks, body_data.timestamp)
+        energy = float(features[MOTION_ENERGY])
+        timestamp = body_data.timestamp
+
+        if not self.moving:
+            if energy < self.start_threshold:
+                return None
+            self.moving = True
+            self.start = timestamp
+            self.quiet_since = None
+
+        self._add(body_data)
+
+        if energy < self.end_threshold:
+            if self.quiet_since is None:
+                self.quiet_since = timestamp
+            if timestamp - self.quiet_since >= self.end_hold:
+                return self._finish(timestamp)
+        else:
+            self.quiet_since = None
+
+        if timestamp - self.start >= self.max_duration:
+            # emit the part and continue with a new segment of the same gesture
+            segment = self._finish(timestamp)
+            self.moving = True
+            self.start = timestamp
+            return segment
+        return None
+
+    def flush(self, timestamp: float, person_id: int = 0) -> list:
+        """
+        Ends the stream of a visitor that is gone for good, e.g. a track that was lost or the end of a replay.
+        :return: The gesture that was cut off and the empty detection of the departure, if the visitor was present.
+        """
+        chunks = []
+        if self.present:
+            segment = self._finish(timestamp)
+            if segment is not None:
+                chunks.append(segment)
+            chunks.append(BodyModel(timestamp=timestamp, person_id=person_id))
+        elif self.departure is not None:
+            chunks.append(self.departure)
+        self.present = False
+        self.departure = None
+        self.kinematics.reset()
+        return chunks
+
+    def _add(self, body_data):
+        if self.chunk is None:
+            # own the chunk, the frame might be reused by the caller
+            self.chunk = copy.copy(body_data)
+            self.chunk.landmarks = np.array(body_data.landmarks, dtype=np.float32, copy=True)
+            if body_data.kinematics is not None:
+                self.chunk.kinematics = np.array(body_data.kinematics, dtype=np.float32, copy=True)
+            self.amount = 1
+            return
+        self.chunk.landmarks += body_data.landmarks
+        if self.chunk.kinematics is not None:
+            if body_data.kinematics is not None:
+                self.chunk.kinematics += body_data.kinematics
+            else:
+                self.chunk.kinematics = None
+        self.amount += 1
+
+    def _finish(self, timestamp: float):
+        chunk, amount, duration = self.chunk, self.amount, timestamp - self.start
+        self.reset()
+        if chunk is None or duration < self.min_duration:
+            return None
+        chunk.landmarks *= 1 / amount
+        if chunk.kinematics is not None:
+            chunk.kinematics *= 1 / amount
+        logger.info("Gesture segment of %.1fs", duration, extra={"duration": duration, "frames": amount})
+        return chunk
@@ -0,0 +1,223 @@
+"""
+    A shared inference server, so several installations use one loaded language model.
+    Each installation registers its animation names once and then sends the gestures it sees. Requests are served in
+    round robin order across the installations. Every installation has at most a few pending requests, a newer gesture
+    replaces the oldest waiting one, so a busy installation can not delay the others.
+    :usage:
+    python -m lblm.server [--host 0.0.0.0] [--port 8000]
+    python -m lblm --server http://<host>:8000
+"""
+
+import asyncio
+import atexit
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import click
+
+from .brain import Brain, complete
+from . import log
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Request:
+    gesture: str
+    future: Future
+    submitted: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class Client:
+    options: str  # the comma separated animation names of the installation
+    pending: deque = field(default_factory=deque)
+
+
+class Scheduler:
+    """Runs the requests of all clients on one language model, taking turns between the clients"""
+
+    def __init__(self, llm, max_pending: int = 2):
+        """
+        :param llm: The language model.
+        :param max_pending: The number of requests a client can have waiting, the oldest one is dropped beyond that.
+        """
+        self.llm = llm
+        self.max_pending = max_pending
+        self.clients: dict[str, Client] = {}
+        self.turns: deque[str] = deque()  # the order the clients are served in
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def register(self, client_id: str, options: list[str]):
+        with self.condition:
+            client = self.clients.get(client_id)
+            if client is None:
+                self.clients[client_id] = Client(", ".join(options))
+                self.turns.append(client_id)
+            else:
+                client.options = ", ".join(options)
+
+    def submit(self, client_id: str, gesture: str) -> Future:
+        """
+        Queues a gesture of a client.
+        :return: A future of the raw response, None if the request was dropped for a newer one.
+        """
+        request = Request(gesture, Future())
+        with self.condition:
+            client = self.clients[client_id]
+            client.pending.append(request)
+            if len(client.pending) > self.max_pending:
+                client.pending.popleft().future.set_result(None)
+            self.condition.notify()
+        return request.future
+
+    def next_request(self) -> tuple[Client, Request]:
+        """Waits for the next request, the clients take turns"""
+        with self.condition:
+            while True:
+                for _ in range(len(self.turns)):
+                    client_id = self.turns[0]
+                    self.turns.rotate(-1)
+                    client = self.clients[client_id]
+                    if client.pending:
+                        return client, client.pending.popleft()
+                self.condition.wait()
+
+    def run(self):
+        while True:
+            client, request = self.next_request()
+            started = time.perf_counter()
+            try:
+                content = complete(self.llm, request.gesture, client.options)
+            except Exception as e:
+                request.future.set_exception(e)
+                continue
+            request.future.set_result({
+                "content": content,
+                "queue_time": started - request.submitted,
+                "inference_time": time.perf_counter() - started,
+            })
+
+
+def create_app(scheduler: Scheduler):
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class Registration(BaseModel):
+        options: list[str]
+
+    class Gesture(BaseModel):
+        gesture: str
+
+    app = FastAPI()
+
+    @app.put("/clients/{client_id}")
+    async def register(client_id: str, registration: Registration):
+        scheduler.register(client_id, registration.options)
+        return {"client_id": client_id, "options": len(registration.options)}
+
+    @app.post("/clients/{client_id}/complete")
+    async def infer(client_id: str, gesture: Gesture):
+        if client_id not in scheduler.clients:
+            raise HTTPException(status_code=404, detail="Unknown client, register its options first")
+        result = await asyncio.wrap_future(scheduler.submit(client_id, gesture.gesture))
+        if result is None:
+            return {"content": "", "dropped": True}
+        return result
+
+    return app
+
+
+class RemoteBrain(Brain):
+    """
+    A Brain that uses a shared inference server instead of loading its own language model.
+    Gating and the search for the most similar animation still run locally, only the completion is sent to the server.
+    """
+
+    def __init__(self, url: str, client_id: str | None = None, **kwargs):
+        """
+        :param url: The base url of the server.
+        :param client_id: The name of the installation on the server, the host name by default.
+        """
+        super().__init__(**kwargs)
+        self.url = url.rstrip("/")
+        self.client_id = client_id or socket.gethostname()
+        # seconds between the attempts to register while the server is not reachable, doubled up to the maximum
+        self.retry_delay = 1.0
+        self.max_retry_delay = 30.0
+
+    def setup(self):
+        """Registers at the server, retried with a growing delay until the server answers or the Brain stops"""
+        import httpx
+
+        self.client = httpx.Client(base_url=self.url, timeout=60)
+        delay = self.retry_delay
+        while True:
+            try:
+                self.register()
+                return
+            except httpx.HTTPError as e:
+                logger.warning("Could not register at inference server %s, retrying in %.0fs: %s", self.url, delay, e)
+            if self.stop_event.wait(delay):
+                return
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def register(self):
+        response = self.client.put(f"/clients/{self.client_id}", json={"options": self.catalog.names})
+        response.raise_for_status()
+        logger.info("Registered at inference server %s as %s", self.url, self.client_id)
+
+    def teardown(self):
+        self.client.close()
+
+    def complete(self, gesture: str) -> str:
+        """Returns the raw response of the server, an empty response if the server could not answer"""
+        import httpx
+
+        try:
+            response = self.client.post(f"/clients/{self.client_id}/complete", json={"gesture": gesture})
+            if response.status_code == 404:
+                # the server restarted and lost the registration
+                logger.warning("Unknown to inference server %s, registering again", self.url)
+                self.register()
+                response = self.client.post(f"/clients/{self.client_id}/complete", json={"gesture": gesture})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning("Inference server request failed, skipping the gesture: %s", e)
+            return ""
+        result = response.json()
+        if result.get("dropped"):
+            logger.warning("Request was dropped by the server for a newer one")
+        else:
+            logger.info("Server queue %.0fms, inference %.0fms", result["queue_time"] * 1000, result["inference_time"] * 1000,
+                        extra={"queue_time": result["queue_time"], "inference_time": result["inference_time"]})
+        return result["content"]
+
+
+@click.command()
+@click.option('--host', default="0.0.0.0", show_default=True, help="Interface to listen on")
+@click.option('--port', type=int, default=8000, show_default=True, help="Port to listen on")
+@click.option('--max-pending', type=click.IntRange(min=1), default=2, show_default=True, help="Requests a client can have waiting before the oldest is dropped")
+@click.option('--log-level', type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False), default="INFO", show_default=True, help="Minimum level of the log messages")
+@click.option('--log-file', type=click.Path(dir_okay=False), default=None, help="Also write the log messages to this file as JSON lines")
+def main(host: str, port: int, max_pending: int, log_level: str, log_file: str | None):
+    """
+    Shared inference server for several LBLM installations
+    """
+    atexit.register(log.start(level=log_level.upper(), jsonl_path=log_file).stop)
+    import uvicorn
+    from .brain import load_llm
+
+    scheduler = Scheduler(load_llm(), max_pending=max_pending)
+    uvicorn.run(create_app(scheduler), host=host, port=port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#version 120
+
+// gradient.vert with the skinning done on the GPU, the joint matrices of the current frame are passed by Panda3D
+// when the actor's ShaderAttrib has the F_hardware_skinning flag set
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat4 p3d_TransformTable[100];
+
+attribute vec4 p3d_Vertex;
+attribute vec3 p3d_Normal;
+attribute vec4 transform_weight;
+attribute vec4 transform_index;
+
+varying float tint_value;
+
+void main() {
+    mat4 skin = p3d_TransformTable[int(transform_index.x)] * transform_weight.x
+              + p3d_TransformTable[int(transform_index.y)] * transform_weight.y
+              + p3d_TransformTable[int(transform_index.z)] * transform_weight.z
+              + p3d_TransformTable[int(transform_index.w)] * transform_weight.w;
+    vec4 vertex = skin * p3d_Vertex;
+
+    vec4 view_pos = p3d_ModelViewMatrix * vertex;
+    float minVal = 2.2;
+    float maxVal = 2.6;
+    tint_value = clamp((-view_pos.z-minVal)/(maxVal-minVal), 0.0, 1.0);
+    gl_Position = p3d_ModelViewProjectionMatrix * vertex;
+}
@@ -0,0 +1,15 @@
+#version 120
+
+uniform float osg_FrameTime;
+uniform float progress_start;
+uniform float progress_duration;
+uniform vec4 fill_color;
+uniform vec4 track_color;
+
+varying float ring_fraction;
+
+void main() {
+    // the countdown runs on the GPU, the CPU only sets the start and the duration once per response
+    float progress = clamp((osg_FrameTime - progress_start) / max(progress_duration, 0.001), 0.0, 1.0);
+    gl_FragColor = ring_fraction <= progress ? fill_color : track_color;
+}
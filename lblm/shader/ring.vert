@@ -0,0 +1,13 @@
+#version 120
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+
+attribute vec4 p3d_Vertex;
+attribute float fraction;  // position around the ring from 0 to 1
+
+varying float ring_fraction;
+
+void main() {
+    ring_fraction = fraction;
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+}
@@ -0,0 +1,309 @@
+"""
+    Samples the skeleton of glTF animations directly, without rendering them.
+    The joints of the Mixamo rig are mapped onto the 33 landmarks of MediaPipe Pose, so the result can be used like the
+    landmarks detected on a rendered frame of the animation.
+"""
+
+import json
+import os
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
+
+# Mixamo joints for each MediaPipe landmark, the first available candidate is used. Candidates that are a tuple are
+# averaged.
+LANDMARK_JOINTS = [
+    [("Head", "HeadTop_End"), "Head"],  # 0 nose
+    ["LeftEye", "Head"], ["LeftEye", "Head"], ["LeftEye", "Head"],  # 1-3 left eye inner, eye, outer
+    ["RightEye", "Head"], ["RightEye", "Head"], ["RightEye", "Head"],  # 4-6 right eye inner, eye, outer
+    ["LeftEye", "Head"], ["RightEye", "Head"],  # 7-8 ears
+    ["Head"], ["Head"],  # 9-10 mouth
+    ["LeftArm"], ["RightArm"],  # 11-12 shoulders
+    ["LeftForeArm"], ["RightForeArm"],  # 13-14 elbows
+    ["LeftHand"], ["RightHand"],  # 15-16 wrists
+    ["LeftHandPinky1", "LeftHand"], ["RightHandPinky1", "RightHand"],  # 17-18 pinkies
+    ["LeftHandIndex1", "LeftHand"], ["RightHandIndex1", "RightHand"],  # 19-20 index fingers
+    ["LeftHandThumb1", "LeftHand"], ["RightHandThumb1", "RightHand"],  # 21-22 thumbs
+    ["LeftUpLeg"], ["RightUpLeg"],  # 23-24 hips
+    ["LeftLeg"], ["RightLeg"],  # 25-26 knees
+    ["LeftFoot"], ["RightFoot"],  # 27-28 ankles
+    ["LeftFoot"], ["RightFoot"],  # 29-30 heels
+    ["LeftToeBase", "LeftFoot"], ["RightToeBase", "RightFoot"],  # 31-32 foot indices
+]
+
+# The calibration to the landmarks MediaPipe detected on the renders the shipped search space was built from, fitted
+# with `python tools/skel2vec.py --calibrate`. x and y are projected like the fixed camera of the renders, the frame
+# coordinate per unit of the world axis and the frame coordinate of the world origin. z is measured from the middle of
+# the hips like MediaPipe does, with the depth offset MediaPipe puts on each landmark, e.g. the face in front of the
+# body. The visibility is the mean visibility MediaPipe gives each landmark on the renders.
+FRAME_SCALE = np.array([0.543, -0.352], dtype=np.float32)
+FRAME_ORIGIN = np.array([0.500, 0.800], dtype=np.float32)
+DEPTH_SCALE = -0.648
+LANDMARK_DEPTH = np.array([
+    -0.511, -0.537, -0.537, -0.537, -0.531, -0.531, -0.531, -0.410, -0.380, -0.488, -0.479,
+    -0.297, -0.261, -0.296, -0.257, -0.366, -0.342, -0.385, -0.358, -0.400, -0.375, -0.367,
+    -0.345, -0.020, 0.020, -0.050, 0.009, 0.083, 0.175, 0.091, 0.190, -0.030, 0.083,
+], dtype=np.float32)
+LANDMARK_VISIBILITY = np.array([
+    1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00,
+    1.00, 1.00, 0.95, 0.92, 0.85, 0.86, 0.77, 0.80, 0.78, 0.80, 0.76,
+    0.78, 1.00, 1.00, 0.98, 0.96, 0.97, 0.94, 0.92, 0.88, 0.96, 0.93,
+], dtype=np.float32)
+
+
+def read_glb(path: str) -> tuple[dict, bytes]:
+    """
+    Reads a binary glTF file. The JSON is parsed with the standard library, which is a lot faster than building the
+    document classes of pygltflib, and the accessors are read from the binary chunk without copying.
+    :param path: The path to the .glb file.
+    :return: The glTF document and its binary chunk.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, version, _ = struct.unpack_from("<4sII", data, 0)
+    if magic != b"glTF" or version != 2:
+        raise ValueError(f"{path} is not a binary glTF 2.0 file")
+
+    document, blob = None, b""
+    offset = 12
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = memoryview(data)[offset + 8:offset + 8 + length]
+        if chunk_type == 0x4E4F534A:  # JSON
+            document = json.loads(bytes(chunk))
+        elif chunk_type == 0x004E4942:  # BIN
+            blob = chunk
+        offset += 8 + length
+
+    if document is None:
+        raise ValueError(f"{path} has no JSON chunk")
+    return document, blob
+
+
+def read_accessor(gltf: dict, blob: bytes, index: int) -> np.ndarray:
+    """
+    Reads an accessor of a binary glTF as a (count, components) float array.
+    :param gltf: The glTF document.
+    :param blob: The binary chunk of the document.
+    :param index: The index of the accessor.
+    """
+    accessor = gltf["accessors"][index]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    dtype = np.dtype(COMPONENT_TYPES[accessor["componentType"]])
+    size = TYPE_SIZES[accessor["type"]]
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    stride = view.get("byteStride") or dtype.itemsize * size
+
+    data = np.ndarray((accessor["count"], size), dtype=dtype, buffer=blob, offset=offset,
+                      strides=(stride, dtype.itemsize))
+    if accessor.get("normalized") and dtype.kind in "iu":
+        return np.maximum(data / np.iinfo(dtype).max, -1.0).astype(np.float32)
+    return data.astype(np.float32)
+
+
+def quaternion_matrices(quaternions: np.ndarray) -> np.ndarray:
+    """Converts (..., 4) quaternions in glTF order (x, y, z, w) to (..., 3, 3) rotation matrices."""
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    x, y, z, w = np.moveaxis(quaternions, -1, 0)
+    return np.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y),
+    ], axis=-1).reshape(quaternions.shape[:-1] + (3, 3))
+
+
+def sample_channel(times: np.ndarray, values: np.ndarray, samples: np.ndarray, interpolation: str,
+                   is_rotation: bool) -> np.ndarray:
+    """
+    Samples an animation channel at the given times.
+    :param times: The keyframe times of the channel.
+    :param values: The keyframe values of the channel.
+    :param samples: The times to sample at.
+    :param interpolation: The glTF interpolation of the channel.
+    :param is_rotation: If the values are quaternions, they are normalized after interpolating.
+    :return: The (len(samples), components) sampled values.
+    """
+    if interpolation == "CUBICSPLINE":
+        values = values[1::3]  # only use the values, not the tangents
+
+    index = np.clip(np.searchsorted(times, samples, side="right") - 1, 0, len(times) - 1)
+    if interpolation == "STEP" or len(times) == 1:
+        return values[index]
+
+    next_index = np.minimum(index + 1, len(times) - 1)
+    span = np.maximum(times[next_index] - times[index], 1e-9)
+    weight = np.clip((samples - times[index]) / span, 0.0, 1.0)[:, None]
+
+    start, end = values[index], values[next_index]
+    if is_rotation:
+        # take the shorter path between the quaternions
+        end = np.where(np.sum(start * end, axis=1, keepdims=True) < 0, -end, end)
+        result = start + (end - start) * weight
+        return result / np.linalg.norm(result, axis=1, keepdims=True)
+    return start + (end - start) * weight
+
+
+def joint_name(name: str) -> str:
+    """Strips the rig prefix of a Mixamo joint name, e.g. mixamorig:LeftArm -> LeftArm"""
+    return name.split(":")[-1]
+
+
+@dataclass
+class Clip:
+    """The sampled joint positions of an animation"""
+    name: str
+    joint_names: list[str]
+    times: np.ndarray  # (frames,) sample times in seconds
+    positions: np.ndarray  # (frames, joints, 3) world positions in glTF coordinates (y up, facing +z)
+
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.times)
+
+    def bounds(self) -> np.ndarray:
+        """The (2, 3) minimum and maximum joint position over the whole clip."""
+        return np.stack([self.positions.min(axis=(0, 1)), self.positions.max(axis=(0, 1))])
+
+
+def load_clip(path: str, fps: float = 30, animation: int = 0) -> Clip:
+    """
+    Samples the global joint positions of an animation.
+    :param path: The path to the .glb file.
+    :param fps: The sampling rate in frames per second.
+    :param animation: The index of the animation in the file.
+    """
+    gltf, blob = read_glb(path)
+    nodes = gltf["nodes"]
+
+    # rest pose of all nodes
+    translations = np.zeros((len(nodes), 3), dtype=np.float32)
+    rotations = np.tile(np.array([0, 0, 0, 1], dtype=np.float32), (len(nodes), 1))
+    scales = np.ones((len(nodes), 3), dtype=np.float32)
+    matrices: dict[int, np.ndarray] = {}
+    for index, node in enumerate(nodes):
+        if "matrix" in node:
+            matrices[index] = np.array(node["matrix"], dtype=np.float32).reshape(4, 4).T  # column major
+        if "translation" in node:
+            translations[index] = node["translation"]
+        if "rotation" in node:
+            rotations[index] = node["rotation"]
+        if "scale" in node:
+            scales[index] = node["scale"]
+
+    # sample the animated channels
+    clip_animation = gltf["animations"][animation] if gltf.get("animations") else None
+    duration = 0.0
+    if clip_animation:
+        for sampler in clip_animation["samplers"]:
+            duration = max(duration, float(gltf["accessors"][sampler["input"]]["max"][0]))
+    samples = np.arange(0, duration + 0.5 / fps, 1 / fps, dtype=np.float32) if duration > 0 else np.zeros(1, np.float32)
+
+    frame_translations = np.repeat(translations[None], len(samples), axis=0)
+    frame_rotations = np.repeat(rotations[None], len(samples), axis=0)
+    frame_scales = np.repeat(scales[None], len(samples), axis=0)
+    if clip_animation:
+        targets = {"translation": frame_translations, "rotation": frame_rotations, "scale": frame_scales}
+        for channel in clip_animation["channels"]:
+            node, target = channel["target"].get("node"), channel["target"]["path"]
+            if node is None or target not in targets:
+                continue  # morph target weights are not needed
+            sampler = clip_animation["samplers"][channel["sampler"]]
+            times = read_accessor(gltf, blob, sampler["input"])[:, 0]
+            values = read_accessor(gltf, blob, sampler["output"])
+            targets[target][:, node] = sample_channel(
+                times, values, samples, sampler.get("interpolation", "LINEAR"), target == "rotation")
+            matrices.pop(node, None)  # animated nodes use their TRS
+
+    # local transforms of all nodes for all frames at once
+    local = np.zeros((len(samples), len(nodes), 4, 4), dtype=np.float32)
+    local[..., :3, :3] = quaternion_matrices(frame_rotations) * frame_scales[:, :, None, :]
+    local[..., :3, 3] = frame_translations
+    local[..., 3, 3] = 1
+    for index, matrix in matrices.items():
+        local[:, index] = matrix
+
+    # global transforms, parents before their children
+    world = np.empty_like(local)
+    scene = gltf["scenes"][gltf.get("scene", 0)]
+    stack = [(root, None) for root in reversed(scene["nodes"])]
+    while stack:
+        index, parent = stack.pop()
+        world[:, index] = local[:, index] if parent is None else world[:, parent] @ local[:, index]
+        stack.extend((child, index) for child in reversed(nodes[index].get("children", [])))
+
+    if gltf.get("skins"):
+        joints = gltf["skins"][0]["joints"]
+    else:
+        joints = [index for index, node in enumerate(nodes) if "name" in node]
+    return Clip(
+        name=os.path.splitext(os.path.basename(path))[0],
+        joint_names=[joint_name(nodes[index].get("name", str(index))) for index in joints],
+        times=samples,
+        positions=world[:, joints][..., :3, 3],
+    )
+
+
+def map_joints(clip: Clip) -> np.ndarray:
+    """
+    Maps the joints of a clip onto the MediaPipe landmark layout, in world coordinates.
+    The depth is measured from the middle of the hips of each frame, if the rig has hips.
+    :return: The (frames, 33, 4) positions, the last channel is 1 for landmarks with a matching joint and 0 otherwise.
+    """
+    lookup = {name: index for index, name in enumerate(clip.joint_names)}
+    positions = np.zeros((clip.frame_count, 33, 4), dtype=np.float32)
+
+    for landmark, candidates in enumerate(LANDMARK_JOINTS):
+        for candidate in candidates:
+            names = candidate if isinstance(candidate, tuple) else (candidate,)
+            if all(name in lookup for name in names):
+                positions[:, landmark, :3] = np.mean(clip.positions[:, [lookup[name] for name in names]], axis=1)
+                positions[:, landmark, 3] = 1.0
+                break
+
+    if positions[0, 23, 3] and positions[0, 24, 3]:
+        positions[..., 2] -= (positions[:, 23:24, 2] + positions[:, 24:25, 2]) / 2
+    return positions
+
+
+def to_landmarks(clip: Clip) -> np.ndarray:
+    """
+    Maps the joints of a clip onto the MediaPipe landmarks, calibrated to the landmarks MediaPipe detects on a render
+    of the animation: x to the right and y down, normalized to the frame, z relative to the middle of the hips and
+    negative towards the camera. Landmarks without a matching joint stay zero like undetected ones.
+    :return: The (frames, 33, 4) landmarks.
+    """
+    positions = map_joints(clip)
+    matched = positions[..., 3:]
+
+    landmarks = np.empty_like(positions)
+    landmarks[..., :2] = positions[..., :2] * FRAME_SCALE + FRAME_ORIGIN
+    landmarks[..., 2] = positions[..., 2] * DEPTH_SCALE + LANDMARK_DEPTH
+    landmarks[..., 3] = LANDMARK_VISIBILITY
+    landmarks *= matched
+    return landmarks
+
+
+def extract_vector(path: str, fps: float = 30) -> np.ndarray:
+    """
+    Computes the search space entry of an animation, the landmarks averaged over all frames.
+    :param path: The path to the .glb animation.
+    :param fps: The sampling rate in frames per second.
+    :return: The (33, 4) averaged landmarks.
+    """
+    return np.mean(to_landmarks(load_clip(path, fps=fps)), axis=0).astype(np.float32)
@@ -0,0 +1,308 @@
+"""
+    Streams the frames of the visualizer to other processes and machines.
+    A FrameGrabber copies every rendered frame into a reused RGB buffer and hands it to the sinks. The sinks never block
+    the render loop, frames are dropped instead when a consumer can not keep up.
+"""
+
+import asyncio
+import queue
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# sequence number and timestamp in front of the frame, the sequence number is odd while a frame is being written
+SHM_HEADER = struct.Struct("<Qd")
+
+
+class FrameSink(ABC):
+    """A consumer of the rendered frames"""
+
+    @abstractmethod
+    def write(self, frame: np.ndarray, timestamp: float):
+        """
+        :param frame: The (height, width, 3) RGB frame. It is reused for the next frame, sinks keeping it must copy it.
+        :param timestamp: The frame time in seconds.
+        """
+
+    def close(self):
+        pass
+
+
+class SharedMemorySink(FrameSink):
+    """
+    Writes the latest frame into a named shared memory block, for a compositor on the same machine.
+    The block holds the header (sequence number, timestamp) followed by the frame. A reader copies the frame and checks
+    that the sequence number was even and did not change meanwhile, see SharedMemorySource.
+    """
+
+    def __init__(self, name: str, shape: tuple[int, int, int]):
+        self.shape = shape
+        size = SHM_HEADER.size + int(np.prod(shape))
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left over by a crashed run
+            self.memory = shared_memory.SharedMemory(name=name)
+            if self.memory.size < size:
+                self.memory.close()
+                self.memory.unlink()
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.frame = np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf, offset=SHM_HEADER.size)
+        self.sequence = 0
+
+    def write(self, frame: np.ndarray, timestamp: float):
+        self.sequence += 1
+        SHM_HEADER.pack_into(self.memory.buf, 0, self.sequence, timestamp)
+        np.copyto(self.frame, frame)
+        self.sequence += 1
+        SHM_HEADER.pack_into(self.memory.buf, 0, self.sequence, timestamp)
+
+    def close(self):
+        del self.frame
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedMemorySource:
+    """Reads the frames of a SharedMemorySink"""
+
+    def __init__(self, name: str, shape: tuple[int, int, int]):
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.frame = np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf, offset=SHM_HEADER.size)
+        self.sequence = 0
+
+    def read(self, out: np.ndarray | None = None) -> tuple[np.ndarray, float] | None:
+        """
+        Copies the latest frame.
+        :param out: The buffer to copy the frame into, a new one is allocated if None.
+        :return: The frame and its timestamp, None if there is no new complete frame.
+        """
+        if out is None:
+            out = np.empty_like(self.frame)
+        for _ in range(3):
+            sequence, timestamp = SHM_HEADER.unpack_from(self.memory.buf, 0)
+            if sequence % 2 or sequence == self.sequence:
+                return None
+            np.copyto(out, self.frame)
+            if SHM_HEADER.unpack_from(self.memory.buf, 0)[0] == sequence:
+                self.sequence = sequence
+                return out, timestamp
+        return None
+
+    def close(self):
+        del self.frame
+        self.memory.close()
+
+
+class MJPEGSink(FrameSink):
+    """
+    Serves the frames as a multipart MJPEG stream over HTTP, viewable in any browser or player.
+    The frames are JPEG encoded in a thread pool and only while a client is connected. If all encoders are busy the frame
+    is skipped.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8080, quality: int = 80, workers: int = 2,
+                 max_fps: float = 30):
+        import cv2
+        import uvicorn
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+
+        self.cv2 = cv2
+        self.quality = quality
+        self.interval = 1 / max_fps
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg")
+        self.buffers: queue.SimpleQueue[np.ndarray] = queue.SimpleQueue()  # free frame copies for the encoders
+        self.free_buffers = workers
+        self.lock = threading.Lock()
+
+        self.jpeg: bytes | None = None
+        self.jpeg_sequence = 0
+        self.clients = 0
+        self.last_write = 0.0
+
+        app = FastAPI()
+
+        @app.get("/")
+        async def stream():
+            return StreamingResponse(self.frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        logger.info("Streaming MJPEG on http://%s:%d/", host, port)
+
+    async def frames(self):
+        self.clients += 1
+        sequence = 0
+        try:
+            while True:
+                if self.jpeg_sequence != sequence:
+                    sequence = self.jpeg_sequence
+                    jpeg = self.jpeg
+                    yield b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode() + \
+                        b"\r\n\r\n" + jpeg + b"\r\n"
+                await asyncio.sleep(self.interval / 2)
+        finally:
+            self.clients -= 1
+
+    def write(self, frame: np.ndarray, timestamp: float):
+        if not self.clients or timestamp - self.last_write < self.interval:
+            return
+        try:
+            buffer = self.buffers.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                if not self.free_buffers:
+                    return  # all encoders busy, skip the frame
+                self.free_buffers -= 1
+            buffer = np.empty_like(frame)
+        self.last_write = timestamp
+        np.copyto(buffer, frame)
+        self.executor.submit(self.encode, buffer)
+
+    def encode(self, buffer: np.ndarray):
+        try:
+            # the frames are RGB, OpenCV expects BGR
+            ok, jpeg = self.cv2.imencode(".jpg", buffer[..., ::-1], [self.cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                self.jpeg = jpeg.tobytes()
+                self.jpeg_sequence += 1
+        finally:
+            self.buffers.put(buffer)
+
+    def close(self):
+        self.server.should_exit = True
+        self.executor.shutdown(wait=False)
+
+
+class VideoFileSink(FrameSink):
+    """
+    Encodes the frames into a video file with ffmpeg.
+    The encoder runs in its own thread behind a short queue, frames are dropped when it falls behind.
+    """
+
+    def __init__(self, path: str, shape: tuple[int, int, int], fps: float = 30, queue_size: int = 4):
+        import imageio_ffmpeg
+
+        height, width = shape[:2]
+        self.writer = imageio_ffmpeg.write_frames(path, (width, height), fps=fps, codec="libx264")
+        self.writer.send(None)  # start the encoder
+        self.frames: queue.Queue[np.ndarray | None] = queue.Queue(maxsize=queue_size)
+        self.buffers: queue.SimpleQueue[np.ndarray] = queue.SimpleQueue()
+        for _ in range(queue_size + 1):
+            self.buffers.put(np.empty(shape, dtype=np.uint8))
+        self.dropped = 0
+        self.failed = False  # if the encoder stopped on an error, the frames are dropped from then on
+        self.thread = threading.Thread(target=self.encode, daemon=True)
+        self.thread.start()
+
+    def write(self, frame: np.ndarray, timestamp: float):
+        if self.failed:
+            self.dropped += 1
+            return
+        try:
+            buffer = self.buffers.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        np.copyto(buffer, frame)
+        try:
+            self.frames.put_nowait(buffer)
+        except queue.Full:
+            self.buffers.put(buffer)
+            self.dropped += 1
+
+    def encode(self):
+        try:
+            while (buffer := self.frames.get()) is not None:
+                self.writer.send(buffer)
+                self.buffers.put(buffer)
+            self.writer.close()
+        except Exception:
+            self.failed = True
+            logger.exception("Video encoder failed, the frames are dropped")
+
+    def close(self, timeout: float = 10.0):
+        """
+        Finishes the video file.
+        :param timeout: The seconds to wait for the encoder to write the queued frames.
+        """
+        if self.thread.is_alive():
+            try:
+                self.frames.put(None, timeout=timeout)
+            except queue.Full:
+                logger.error("Video encoder is stuck, the video might be incomplete")
+            self.thread.join(timeout)
+        if self.dropped:
+            logger.warning("Dropped %d frames of the video", self.dropped)
+
+
+def create_sink(spec: str, shape: tuple[int, int, int], fps: float = 30) -> FrameSink:
+    """
+    Creates a sink from its description.
+    :param spec: shm:<name> for shared memory, http://<host>:<port> for MJPEG or a video file path.
+    :param shape: The (height, width, 3) shape of the frames.
+    :param fps: The frame rate of the stream.
+    """
+    if spec.startswith("shm:"):
+        return SharedMemorySink(spec[len("shm:"):], shape)
+    if spec.startswith("http://"):
+        host, _, port = spec[len("http://"):].rstrip("/").rpartition(":")
+        return MJPEGSink(host or "0.0.0.0", int(port or 8080), max_fps=fps or 30)
+    return VideoFileSink(spec, shape, fps=fps or 30)
+
+
+class FrameGrabber:
+    """
+    Copies every frame rendered into the window of a ShowBase to the sinks.
+    Panda3D copies the frame into the RAM image of a texture after rendering, it is flipped and reordered to RGB in a
+    single copy into a reused buffer.
+    """
+
+    def __init__(self, base, sinks: list[FrameSink]):
+        from direct.task import Task
+        from panda3d.core import GraphicsOutput, Texture
+
+        self.base = base
+        self.sinks = sinks
+        self.texture = Texture("frame")
+        base.win.addRenderTexture(self.texture, GraphicsOutput.RTMCopyRam)
+        self.frame = np.empty(self.shape, dtype=np.uint8)
+        self.cont = Task.cont
+        # after the frame was rendered
+        base.taskMgr.add(self.grab, "grab_frame", sort=60)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self.base.win.getYSize(), self.base.win.getXSize(), 3
+
+    def grab(self, task):
+        ram_image = self.texture.getRamImage()
+        if not ram_image:
+            return self.cont
+        height, width = self.texture.getYSize(), self.texture.getXSize()
+        image = np.frombuffer(memoryview(ram_image), dtype=np.uint8)
+        image = image.reshape(height, width, self.texture.getNumComponents())
+        if self.frame.shape != (height, width, 3):
+            return self.cont  # the window was resized, the sinks are fixed to the first size
+        # bottom up BGR(A) to top down RGB
+        np.copyto(self.frame, image[::-1, :, 2::-1])
+        timestamp = time.time()
+        for sink in self.sinks:
+            sink.write(self.frame, timestamp)
+        return self.cont
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,192 @@
+"""
+    Network transport of the landmark stream, so the Detector can run on a different machine than the Brain.
+    Every detection is one UDP datagram with a fixed layout:
+
+        header:    magic (4 bytes), version (uint8), float16 flag (uint8), person id (uint16), sequence number (uint32),
+                   timestamp (float64), process time (float32), frame width (uint16), frame height (uint16)
+        landmarks: float16 or float32[33, 4]
+
+    Lost and late datagrams are skipped, the receiver keeps a short buffer of the newest detections and drops the oldest
+    ones when the Brain falls behind.
+"""
+
+import queue
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .detection import BodyModel
+
+MAGIC = b"LBLM"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIdfHH")
+N_LANDMARKS = 33
+N_VALUES = 4
+
+
+def parse_address(address: str, default_host: str = "0.0.0.0") -> tuple[str, int]:
+    """Parses a host:port address, the host is optional"""
+    host, _, port = address.rpartition(":")
+    return host or default_host, int(port)
+
+
+def packet_size(half: bool) -> int:
+    return HEADER.size + N_LANDMARKS * N_VALUES * (2 if half else 4)
+
+
+class LandmarkSender:
+    """
+    Sends detections to a LandmarkReceiver. It can be used in place of the data queue of a Detector.
+    The datagrams are packed into a reused buffer. If the send buffer of the socket is full the detection is dropped
+    instead of blocking the detection loop.
+    """
+
+    def __init__(self, host: str, port: int, half: bool = True):
+        """
+        :param host: The host of the receiver.
+        :param port: The port of the receiver.
+        :param half: If the landmarks are sent as float16, which halves the datagrams.
+        """
+        self.address = (host, port)
+        self.half = half
+        self.sequence = 0
+        self.dropped = 0
+        self._socket = None
+        self._packet = None
+        self._landmarks = None
+
+    def __getstate__(self):
+        # the socket is created in the process that sends
+        state = self.__dict__.copy()
+        state.update(_socket=None, _packet=None, _landmarks=None)
+        return state
+
+    def _open(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._packet = bytearray(packet_size(self.half))
+        self._landmarks = np.ndarray((N_LANDMARKS, N_VALUES), dtype="<f2" if self.half else "<f4",
+                                     buffer=self._packet, offset=HEADER.size)
+
+    def put(self, body_data, block: bool = True, timeout: float | None = None):
+        """Sends a detection, with the signature of Queue.put"""
+        if self._socket is None:
+            self._open()
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        HEADER.pack_into(self._packet, 0, MAGIC, VERSION, self.half, body_data.person_id & 0xFFFF, self.sequence,
+                         body_data.timestamp, body_data.process_time, body_data.frame_width & 0xFFFF,
+                         body_data.frame_height & 0xFFFF)
+        self._landmarks[...] = body_data.landmarks
+        try:
+            self._socket.sendto(self._packet, self.address)
+        except (BlockingIOError, InterruptedError):
+            self.dropped += 1
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class LandmarkReceiver:
+    """
+    Receives the detections of LandmarkSenders. It can be used in place of the input queue of the Brain.
+    A background thread receives the datagrams into a reused buffer and decodes them into BodyModels. Datagrams that
+    arrive after a newer one of the same sender are discarded.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9930, max_frames: int = 8):
+        """
+        :param host: The interface to listen on.
+        :param port: The port to listen on.
+        :param max_frames: The number of detections buffered, the oldest ones are dropped when it is full.
+        """
+        self.frames: deque = deque(maxlen=max_frames)
+        self.available = threading.Condition()
+
+        self.received = 0
+        self.lost = 0  # sequence gaps
+        self.late = 0
+        self.dropped = 0  # buffer overflows
+        self.last_sequences: dict[tuple[str, int], int] = {}
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.settimeout(0.5)  # to notice close
+        self.address = self._socket.getsockname()
+        self._running = True
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        buffer = bytearray(packet_size(half=False))
+        while self._running:
+            try:
+                size, sender = self._socket.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # closed
+            if size < HEADER.size:
+                continue
+            magic, version, half, person_id, sequence, timestamp, process_time, width, height = \
+                HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC or version != VERSION or size != packet_size(bool(half)):
+                continue
+
+            # the difference of the sequence numbers modulo 2^32, negative if the datagram is older than the last one
+            last = self.last_sequences.get(sender)
+            if last is not None:
+                step = (sequence - last + 2 ** 31) % 2 ** 32 - 2 ** 31
+                if step <= 0:
+                    self.late += 1
+                    continue
+                self.lost += step - 1
+            self.last_sequences[sender] = sequence
+
+            landmarks = np.frombuffer(buffer, dtype="<f2" if half else "<f4", count=N_LANDMARKS * N_VALUES,
+                                      offset=HEADER.size).reshape(N_LANDMARKS, N_VALUES).astype(np.float32)
+            body_data = BodyModel(landmarks=landmarks, frame_width=width, frame_height=height, timestamp=timestamp,
+                                  process_time=process_time, person_id=person_id)
+            self.received += 1
+            with self.available:
+                if len(self.frames) == self.frames.maxlen:
+                    self.dropped += 1
+                self.frames.append(body_data)
+                self.available.notify()
+
+    def get(self, block: bool = True, timeout: float | None = None):
+        """Returns the oldest buffered detection, with the signature of Queue.get"""
+        with self.available:
+            if block:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self.frames:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Empty
+                    self.available.wait(remaining)
+            elif not self.frames:
+                raise queue.Empty
+            return self.frames.popleft()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self) -> bool:
+        return not self.frames
+
+    def put(self, body_data, block: bool = True, timeout: float | None = None):
+        """Adds a local detection, like a detector running on the same machine would"""
+        with self.available:
+            self.frames.append(body_data)
+            self.available.notify()
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._socket.close()
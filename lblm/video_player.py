@@ -0,0 +1,199 @@
+"""
+    Playback of the pre-rendered animation videos of tools/glb2mp4.py instead of rendering the rigged character.
+    Meant for weak hardware: a frame is a texture upload and a crossfade is a 2D blend of two cached frames.
+"""
+
+import os
+import threading
+
+import cv2
+import imageio_ffmpeg
+import numpy as np
+from direct.task import Task
+from panda3d.core import CardMaker, Texture, Point2
+
+from .log import get_logger
+from .scene import _Visualizer
+
+logger = get_logger(__name__)
+
+
+class VideoCache:
+    """
+    The decoded frames of the animation videos, cached on disk as memory mapped arrays.
+    The videos are decoded once in a background thread, idle first. Later runs map the cached frames directly, so only
+    the frames that are actually shown are read from disk.
+    """
+
+    def __init__(self, video_path: str, names: list[str], height: int = 640, cache_path: str | None = None):
+        """
+        :param video_path: The folder of the .mp4 videos.
+        :param names: The names of the animations, the videos are decoded in this order.
+        :param height: The height the frames are cached at, the width keeps the aspect ratio of the videos.
+        :param cache_path: The folder of the cached frames, by default a hidden folder in the video folder.
+        """
+        self.video_path = video_path
+        self.names = names
+        self.height = height
+        self.cache_path = cache_path or os.path.join(video_path, f".frames_{height}")
+        self.clips: dict[str, np.ndarray] = {}
+        self._thread = threading.Thread(target=self._load_all, daemon=True)
+
+    def start(self):
+        os.makedirs(self.cache_path, exist_ok=True)
+        self._thread.start()
+
+    def get(self, name: str) -> np.ndarray | None:
+        """The (frames, height, width, 3) RGB frames of the animation, None while it is not loaded yet."""
+        return self.clips.get(name)
+
+    def _load_all(self):
+        for name in self.names:
+            try:
+                frames = self.load(name)
+            except Exception as e:
+                logger.warning("Could not load video of %s: %s", name, e)
+                continue
+            if frames is not None and len(frames):
+                self.clips[name] = frames
+        logger.info("Loaded %d/%d animation videos", len(self.clips), len(self.names))
+
+    def load(self, name: str) -> np.ndarray | None:
+        video = os.path.join(self.video_path, f"{name}.mp4")
+        if not os.path.exists(video):
+            return None
+
+        cache = os.path.join(self.cache_path, f"{name}.npy")
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(video):
+            return np.load(cache, mmap_mode="r")
+        return self.decode(video, cache)
+
+    def decode(self, video: str, cache: str) -> np.ndarray:
+        """Decodes a video straight into a memory mapped array"""
+        frame_count, _ = imageio_ffmpeg.count_frames_and_secs(video)
+
+        # the first item of the reader is the meta data with the size of the video
+        reader = imageio_ffmpeg.read_frames(video)
+        source_width, source_height = next(reader)["size"]
+        reader.close()
+
+        height = self.height
+        width = int(round(source_width * height / source_height / 2)) * 2
+        reader = imageio_ffmpeg.read_frames(video, output_params=["-vf", f"scale={width}:{height}"])
+        next(reader)
+
+        partial_cache = cache[:-len(".npy")] + ".part.npy"
+        frames = np.lib.format.open_memmap(partial_cache, mode="w+", dtype=np.uint8,
+                                           shape=(frame_count, height, width, 3))
+        decoded = 0
+        try:
+            for data in reader:
+                if decoded == frame_count:
+                    break
+                frames[decoded] = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+                decoded += 1
+        finally:
+            reader.close()
+        frames.flush()
+        del frames
+        os.replace(partial_cache, cache)
+        return np.load(cache, mmap_mode="r")[:decoded]
+
+
+class _VideoVisualizer(_Visualizer):
+    """
+    Shows the pre-rendered videos of the animations on a card instead of the rigged character.
+    The Brain output is handled exactly like by the rendering visualizer, only playing and crossfading differ. There is
+    a single avatar, every response is shown on it.
+    """
+
+    def __init__(self, catalog, queue, is_outputting_event, video_path: str, light: bool = False, loop: bool = False,
+                 fps: float = 30):
+        """
+        :param video_path: The folder of the videos rendered by tools/glb2mp4.py.
+        :param fps: The frame rate the videos were rendered at.
+        """
+        self.video_path = video_path
+        self.video_fps = fps
+        super().__init__(catalog, queue, is_outputting_event, light=light, loop=loop)
+
+    def setup_scene(self, actor_path: str, light: bool):
+        """Prepares the video card, the frames are decoded in the background"""
+        self.videos = VideoCache(self.video_path, self.catalog.names)
+        self.videos.start()
+
+        self.texture = Texture("video")
+        self.card = None
+        self.frame = None  # blend buffer
+
+        # the playing clip and the clip faded out, as (name, start time)
+        self.current: tuple[str, float] | None = None
+        self.previous: tuple[str, float] | None = None
+        self.fade_start = 0.0
+        self.fade_duration = 0.0
+        self.shown = None  # the clip frame currently in the texture
+
+        self.camera.setPos(0, -5, 0)
+        self.camera.lookAt(0, 0, 0)
+        self.taskMgr.add(self.update_video, "update_video")
+
+    def setup_card(self, height: int, width: int):
+        """Creates the card showing the video, in the aspect ratio of the frames"""
+        self.texture.setup2dTexture(width, height, Texture.T_unsigned_byte, Texture.F_rgb)
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+
+        aspect = width / height
+        card_maker = CardMaker("video")
+        card_maker.setFrame(-aspect, aspect, -1, 1)
+        card_maker.setUvRange(Point2(0, 1), Point2(1, 0))  # the frames are stored top down
+        self.card = self.aspect2d.attachNewNode(card_maker.generate())
+        self.card.setTexture(self.texture)
+
+    def play(self, anim: str, slot: int = 0):
+        self.previous = None
+        self.current = (anim, globalClock.getFrameTime())
+
+    def crossfade(self, from_anim: str, to_anim: str, duration: float = 1.0, slot: int = 0):
+        now = globalClock.getFrameTime()
+        self.previous = self.current if self.current else (from_anim, now)
+        self.current = (to_anim, now)
+        self.fade_start = now
+        self.fade_duration = duration
+
+    def clip_frame(self, clip: tuple[str, float], now: float):
+        """The frame of a looping clip at the time, the idle clip stands in for clips that are not loaded yet"""
+        name, start = clip
+        frames = self.videos.get(name)
+        if frames is None:
+            name, frames = "idle", self.videos.get("idle")
+            if frames is None:
+                return None, None
+        index = int((now - start) * self.video_fps) % len(frames)
+        return frames[index], (name, index)
+
+    def update_video(self, task):
+        if self.current is None:
+            return Task.cont
+
+        now = globalClock.getFrameTime()
+        frame, key = self.clip_frame(self.current, now)
+        if frame is None:
+            return Task.cont
+        if self.card is None:
+            self.setup_card(frame.shape[0], frame.shape[1])
+
+        if self.previous is not None and now - self.fade_start < self.fade_duration:
+            previous_frame, _ = self.clip_frame(self.previous, now)
+            if previous_frame is not None and previous_frame.shape == frame.shape == self.frame.shape:
+                alpha = (now - self.fade_start) / self.fade_duration
+                cv2.addWeighted(previous_frame, 1.0 - alpha, frame, alpha, 0.0, dst=self.frame)
+                self.texture.setRamImageAs(self.frame, "RGB")
+                self.shown = None
+                return Task.cont
+        self.previous = None
+
+        # the videos run at a lower rate than the display, only upload new frames
+        if key != self.shown and frame.shape == self.frame.shape:
+            self.texture.setRamImageAs(frame, "RGB")
+            self.shown = key
+        return Task.cont
@@ -0,0 +1,113 @@
+"""
+    Measures the time and the memory allocations per frame of the detection hot path: orienting the camera frame,
+    running the pose model, extracting, filtering and drawing the landmarks and updating the kinematic features.
+    The frames are read from a video, or captured from the camera, before the measurement starts.
+    :usage:
+    python tools/bench_detector.py [--video recording.mp4] [--frames 300] [--no-roi] [--no-smoothing]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from lblm.detector import Detector, extract_landmarks
+
+
+def read_frames(source, count: int) -> list[np.ndarray]:
+    capture = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def process(detector: Detector, frame: np.ndarray):
+    return detector.process_frame(detector.orient_frame(frame))
+
+
+def measure_time(detector: Detector, frames: list[np.ndarray]) -> tuple[float, float]:
+    """:return: The mean and the 95th percentile of the time per frame in milliseconds."""
+    times = np.zeros(len(frames))
+    for index, frame in enumerate(frames):
+        start = time.perf_counter()
+        process(detector, frame)
+        times[index] = time.perf_counter() - start
+    return float(np.mean(times)) * 1000, float(np.percentile(times, 95)) * 1000
+
+
+def measure_allocations(detector: Detector, frames: list[np.ndarray]) -> tuple[float, float, float]:
+    """
+    Traces the Python and numpy allocations while the frames are processed.
+    :return: The mean transient KiB per frame, the KiB retained after all frames and the number of generation 0
+        garbage collections per 100 frames, which run after every 700 allocated container objects.
+    """
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    transient = 0
+    for frame in frames:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        process(detector, frame)
+        transient += tracemalloc.get_traced_memory()[1] - current
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    collections = gc.get_stats()[0]["collections"] - collections
+    return transient / len(frames) / 1024, retained / 1024, collections * 100 / len(frames)
+
+
+def measure_extraction(detector: Detector, frames: list[np.ndarray], repeat: int = 1000) -> float | None:
+    """:return: The microseconds to copy the landmarks of a pose into the reused array, None if no body is found."""
+    for frame in frames:
+        results = detector.detect(detector.orient_frame(frame))
+        if results.pose_landmarks:
+            break
+    else:
+        return None
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract_landmarks(results.pose_landmarks.landmark, landmarks)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame work of the detector")
+    parser.add_argument("--video", help="Video of a person to benchmark on, the camera is used if not given")
+    parser.add_argument("--frames", type=int, default=300, help="Number of measured frames")
+    parser.add_argument("--warmup", type=int, default=30, help="Number of frames processed before measuring")
+    parser.add_argument("--no-roi", action="store_true", help="Process the full frame instead of the body region")
+    parser.add_argument("--no-smoothing", action="store_true", help="Disable the One Euro filter")
+    args = parser.parse_args()
+
+    frames = read_frames(args.video if args.video else 0, args.warmup + args.frames)
+    if len(frames) <= args.warmup:
+        raise SystemExit("Not enough frames to benchmark")
+    warmup, frames = frames[:args.warmup], frames[args.warmup:]
+
+    # a fixed model complexity, so the quality controller does not change the workload while measuring
+    detector = Detector(None, None, target_fps=None, track_roi=not args.no_roi, smooth=not args.no_smoothing)
+    detector.initialize_mediapipe()
+    for frame in warmup:
+        process(detector, frame)
+
+    mean, p95 = measure_time(detector, frames)
+    print(f"time: {mean:.2f}ms mean / {p95:.2f}ms p95 per frame over {len(frames)} frames")
+    transient, retained, collections = measure_allocations(detector, frames)
+    print(f"allocations: {transient:.1f}KiB transient per frame, {retained:.1f}KiB retained, "
+          f"{collections:.1f} gen0 collections per 100 frames")
+    extraction = measure_extraction(detector, frames)
+    if extraction is not None:
+        print(f"landmark extraction: {extraction:.1f}us")
+    else:
+        print("landmark extraction: no body found in the frames")
+    detector.pose.close()
@@ -0,0 +1,76 @@
+"""
+    Measures the CPU time per frame of the character with the skinning done on the CPU and in the vertex shader.
+    The character is rendered offscreen while crossfading between two animations, like the visualizer does.
+    :usage:
+    python tools/bench_skinning.py [--actor lblm/data/character.glb] [--animations lblm/data/animations] [--frames 600]
+"""
+
+import argparse
+import time
+
+from panda3d.core import loadPrcFileData
+
+loadPrcFileData("", "window-type offscreen")
+loadPrcFileData("", "win-size 720 1280")
+loadPrcFileData("", "sync-video false")
+
+from direct.actor.Actor import Actor
+from direct.showbase.ShowBase import ShowBase
+from panda3d.core import ClockObject
+
+from lblm.catalog import AnimationCatalog
+from lblm.scene import apply_shader
+
+
+def run(base: ShowBase, actor_path: str, animations: dict[str, str], hardware_skinning: bool, frames: int,
+        warmup: int = 30) -> tuple[float, float]:
+    """
+    Renders the frames with a fresh actor that blends two animations.
+    :return: The mean CPU and wall time per frame in milliseconds.
+    """
+    actor = Actor(actor_path, animations)
+    actor.reparentTo(base.render)
+    apply_shader(actor, hardware_skinning=hardware_skinning)
+    names = list(animations)
+
+    actor.enableBlend()
+    for name in names:
+        actor.loop(name)
+        actor.setControlEffect(name, 1.0 / len(names))
+
+    clock = ClockObject.getGlobalClock()
+    for _ in range(warmup):
+        clock.tick()
+        base.graphicsEngine.renderFrame()
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(frames):
+        clock.tick()
+        base.graphicsEngine.renderFrame()
+    base.graphicsEngine.syncFrame()
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+
+    actor.cleanup()
+    actor.removeNode()
+    return cpu_time / frames * 1000, wall_time / frames * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU and GPU skinning of the character")
+    parser.add_argument("--actor", default="lblm/data/character.glb", help="Path to the rigged character")
+    parser.add_argument("--animations", default="lblm/data/animations", help="Folder of the .glb animations")
+    parser.add_argument("--frames", type=int, default=600, help="Number of measured frames per mode")
+    args = parser.parse_args()
+
+    catalog = AnimationCatalog.load(animations_path=args.animations, search_space_path=None)
+    blend = dict(list(catalog.animations.items())[:2])
+
+    base = ShowBase()
+    base.camera.setPos(0, -2.2, 1)
+    base.camera.lookAt(0, 0, 1)
+
+    for name, hardware_skinning in (("cpu skinning", False), ("gpu skinning", True)):
+        cpu, wall = run(base, args.actor, blend, hardware_skinning, args.frames)
+        print(f"{name}: {cpu:.2f}ms CPU / {wall:.2f}ms wall per frame")
+    base.destroy()
@@ -1,26 +1,73 @@
 """
     Converts FBX Animations to GLB format using Blender's Python API.
-    This script is intended to be run within Blender's scripting environment. A quick look into the documentation or
-    a quick search online will help you to run this script in Blender. I recommend using the Blender CLI.
+    The script has two roles. Started with a regular Python interpreter it is the batch driver: it splits the input
+    folder across several headless Blender processes, which run this same script as workers.
     :usage:
-    1. Run the script in Blender's scripting environment. (blender --background --python fbx2glb.py)
-    2. Specify the input and output folders. Absolute paths are required.
-    3. The script will convert all FBX files in the input folder to GLB.
+    python tools/fbx2glb.py <input folder> <output folder> [--workers 4] [--blender blender]
+
+    A manifest in the output folder records the content hash of every converted FBX, so only new or changed sources are
+    converted. Every finished file is recorded right away, the conversion can be interrupted and resumed at any time.
+    The files are exported to a hidden temporary folder in the output folder and only moved next to the animations once
+    they are complete, so a crashed worker never leaves a partial file where the animations are loaded from.
 
     This is a quick, dirty and hacky solution to convert FBX animations to GLB format.
-    It should be noted that this script is not optimized for performance and may take a while to run and has only a
-    basic error handling.
+    It has only a basic error handling.
 """
 
-if __name__ == '__main__':
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MANIFEST_NAME = ".fbx2glb-manifest.jsonl"
+
+
+def file_hash(path: str) -> str:
+    """The sha256 hash of the file content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_folder: str) -> dict[str, dict]:
+    """
+    Loads the manifest of the output folder, the last entry of a source wins.
+    :return: The entries keyed by the source file name.
+    """
+    manifest = {}
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return manifest
+    with open(path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut off by an interruption
+            manifest[entry["source"]] = entry
+    return manifest
+
+
+def record_manifest(output_folder: str, entry: dict):
+    """Appends an entry to the manifest, single short appends are safe across the worker processes"""
+    with open(os.path.join(output_folder, MANIFEST_NAME), "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def run_worker(shard_path: str):
+    """Converts the files of a shard, runs inside of Blender"""
     import bpy
-    import os
-
-    # Set input and output folders
-    input_folder = input("Please enter the input folder: ")
-    output_folder = input("Please enter the output folder: ")
 
-    os.makedirs(output_folder, exist_ok=True)
+    with open(shard_path) as file:
+        shard = json.load(file)
+    output_folder = shard["output_folder"]
+    partial_folder = shard["partial_folder"]
 
     # Clear Blender scene
     def full_cleanup() -> None:
@@ -39,31 +86,14 @@ if __name__ == '__main__':
         for block in bpy.data.meshes:
             bpy.data.meshes.remove(block, do_unlink=True)
 
+    for entry in shard["files"]:
+        start = time.perf_counter()
+        fbx_path = entry["path"]
+        glb_name = os.path.splitext(entry["source"])[0] + ".glb"
+        glb_path = os.path.join(output_folder, glb_name)
+        partial_path = os.path.join(partial_folder, glb_name)
 
-    index = 0
-
-    already_converted = [tarfile.replace(".glb", "") for tarfile in os.listdir(output_folder) if
-                         tarfile.lower().endswith(".glb")]
-    print("Already converted animations:", len(already_converted))
-    print(already_converted)
-
-    # Batch convert FBX to GLB
-    for filename in os.listdir(input_folder):
-        index += 1
-        animation_name = filename.replace(".fbx", "")
-        print(f"Processing {index}: {filename} as {animation_name}")
-        # Check if the GLB already exists
-        if animation_name in already_converted:
-            print(f"Skipping {animation_name} with index {index}, already converted.")
-            continue
-
-        elif filename.lower().endswith(".fbx"):
-            fbx_path = os.path.join(input_folder, filename)
-            glb_name = os.path.splitext(filename)[0] + ".glb"
-            glb_path = os.path.join(output_folder, glb_name)
-
-            print(f"Converting {filename} to {glb_name}")
-
+        try:
             full_cleanup()
             bpy.ops.import_scene.fbx(filepath=fbx_path)
 
@@ -76,7 +106,7 @@ if __name__ == '__main__':
                 bpy.context.object.animation_data.action = bpy.data.actions[0]
 
             bpy.ops.export_scene.gltf(
-                filepath=glb_path,
+                filepath=partial_path,
                 export_format='GLB',
                 export_apply=True,
                 export_animations=True,
@@ -84,9 +114,118 @@ if __name__ == '__main__':
                 export_force_sampling=True,  # Force baked animation (good for compatibility)
                 use_selection=False
             )
+            os.replace(partial_path, glb_path)
+        except Exception as e:
+            print(f"Error converting {entry['source']}: {e}", flush=True)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            continue
 
-        else:
+        seconds = time.perf_counter() - start
+        record_manifest(output_folder, {
+            "source": entry["source"],
+            "hash": entry["hash"],
+            "size": entry["size"],
+            "mtime_ns": entry["mtime_ns"],
+            "output": glb_name,
+            "seconds": round(seconds, 3),
+        })
+        print(f"Converted {entry['source']} to {glb_name} in {seconds:.2f}s", flush=True)
+
+
+def run_driver(args):
+    """Finds the files that need a conversion and distributes them across Blender workers"""
+    input_folder = os.path.abspath(args.input_folder)
+    output_folder = os.path.abspath(args.output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+
+    manifest = load_manifest(output_folder)
+
+    todo = []
+    skipped = 0
+    for filename in sorted(os.listdir(input_folder)):
+        if not filename.lower().endswith(".fbx"):
             print(f"------- Skipping {filename}, not an FBX file.")
+            continue
 
-    print("Conversion complete.")
+        path = os.path.join(input_folder, filename)
+        stat = os.stat(path)
+        known = manifest.get(filename)
+        # only hash files whose size or modification time changed since they were recorded
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            content_hash = known["hash"]
+        else:
+            content_hash = file_hash(path)
+
+        converted = known and known["hash"] == content_hash and os.path.exists(os.path.join(output_folder, known["output"]))
+        if converted and not args.force:
+            skipped += 1
+            continue
+        todo.append({"source": filename, "path": path, "hash": content_hash, "size": stat.st_size,
+                     "mtime_ns": stat.st_mtime_ns})
+
+    print(f"{skipped} animations already converted, {len(todo)} to convert")
+    if not todo:
+        return
+
+    # balance the shards by file size, largest files first to the least loaded worker
+    workers = max(1, min(args.workers, len(todo)))
+    shards = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for entry in sorted(todo, key=lambda entry: entry["size"], reverse=True):
+        worker = loads.index(min(loads))
+        shards[worker].append(entry)
+        loads[worker] += entry["size"]
+
+    start = time.perf_counter()
+    # the partial files are written on the same file system as the output, so moving them in place is atomic
+    with tempfile.TemporaryDirectory() as shard_folder, \
+            tempfile.TemporaryDirectory(prefix=".fbx2glb-", dir=output_folder) as partial_folder:
+        processes = []
+        for index, shard in enumerate(shards):
+            shard_path = os.path.join(shard_folder, f"shard_{index}.json")
+            with open(shard_path, "w") as file:
+                json.dump({"output_folder": output_folder, "partial_folder": partial_folder, "files": shard}, file)
+            command = [args.blender, "--background", "--factory-startup", "--python", os.path.abspath(__file__),
+                       "--", "--worker", shard_path]
+            processes.append(subprocess.Popen(command))
+
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            print("Interrupted, finished files are kept and skipped on the next run")
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            raise
+
+    # report the timing of this run from the manifest
+    manifest = load_manifest(output_folder)
+    finished = [manifest[entry["source"]] for entry in todo
+                if entry["source"] in manifest and manifest[entry["source"]]["hash"] == entry["hash"]]
+    wall_time = time.perf_counter() - start
+    cpu_time = sum(entry["seconds"] for entry in finished)
+    print(f"Converted {len(finished)}/{len(todo)} animations with {workers} workers in {wall_time:.1f}s "
+          f"({cpu_time:.1f}s of conversion time)")
+    for entry in sorted(finished, key=lambda entry: entry["seconds"], reverse=True)[:10]:
+        print(f"  {entry['seconds']:7.2f}s {entry['source']}")
 
+
+if __name__ == '__main__':
+    # Blender passes the arguments of the script after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    if argv and argv[0] == "--worker":
+        run_worker(argv[1])
+    else:
+        parser = argparse.ArgumentParser(description="Convert FBX animations to GLB with parallel Blender workers")
+        parser.add_argument("input_folder", help="Folder containing the .fbx animations")
+        parser.add_argument("output_folder", help="Folder the .glb animations are written to")
+        parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help="Number of parallel Blender processes")
+        parser.add_argument("--blender", default="blender", help="Path to the Blender executable")
+        parser.add_argument("--force", action="store_true", help="Convert all files, even unchanged ones")
+        run_driver(parser.parse_args(argv))
+        print("Conversion complete.")
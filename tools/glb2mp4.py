@@ -1,18 +1,24 @@
 """
-    Convert GLB animations to MP4 videos using Panda3D and MoviePy.
-    This script initializes a Panda3D application, loads a GLB model with animations,
-    and records each animation as a video file in MP4 format.
+    Convert GLB animations to MP4 videos using Panda3D and imageio-ffmpeg.
+    This script renders a GLB model with animations offscreen and streams each frame straight from the render texture
+    into an ffmpeg encoder, without writing images to disk. The animations are split across several worker processes,
+    each with its own Panda3D instance.
     Can be executed from the command line.
+    :usage:
+    python tools/glb2mp4.py <actor model> <animations folder> [--output animations/videos] [--workers 4]
 """
 
 
+import argparse
 import math
+import multiprocessing
 import os
-import shutil
+import time
 
-from PIL import Image
-from moviepy import ImageSequenceClip
-from lblm.animations import load_animations
+import imageio_ffmpeg
+import numpy as np
+
+from lblm.catalog import AnimationCatalog
 
 WIDTH = 720
 HEIGHT = 1280
@@ -21,24 +27,23 @@ from panda3d.core import loadPrcFileData
 
 loadPrcFileData("", f"win-size {WIDTH} {HEIGHT} ")  # Set the window size
 loadPrcFileData("", "aspect-ratio 0.5625000246")  # set the aspect ratio to 9:16
+loadPrcFileData("", "window-type offscreen")  # render into an offscreen buffer, no window needed
+loadPrcFileData("", "textures-power-2 none")  # keep the render texture at the exact frame size
 
 from direct.showbase.ShowBase import ShowBase
-from panda3d.core import AmbientLight, DirectionalLight, Vec4, Filename
+from panda3d.core import AmbientLight, DirectionalLight, Vec4, Texture, GraphicsOutput
 from direct.actor.Actor import Actor
 
 
 class Converter(ShowBase):
-    def __init__(self, options:dict[str, str], model_path="data/character.glb"):
+    def __init__(self, options:dict[str, str], model_path="data/character.glb", frame_rate=30):
         # Disable Panda3D's automatic clock advancement
         loadPrcFileData("", "clock-mode limited")  # or "clock-mode none" to disable entirely
         loadPrcFileData("", "sync-video false")  # disable vsync to avoid framerate throttling
 
         ShowBase.__init__(self)
 
-        # init the animations and the base animation
-        self.recorded_index = 0
-        self.frame_index = 0
-        self.frame_rate = 30
+        self.frame_rate = frame_rate
 
         self.disableMouse()
         self.set_background_color(0, 0, 0, 1)
@@ -72,73 +77,100 @@ class Converter(ShowBase):
         self.camera.setPos(center.getX(), center.getY() - cam_dist, center.getZ())
         self.camera.lookAt(center)
 
-        self.warmup_frames = 5  # Number of frames to warm up the animation
-
-        # Start animation cycling
-        self.taskMgr.add(self.record, "RecordTask")
-
-    def record(self, task):
-        if self.warmup_frames > 0:
-            self.warmup_frames -= 1
-            return task.cont
-
-        anim_name = list(self.animations.keys())[self.recorded_index]
-        if os.path.exists(f"animations/videos/{anim_name}.mp4"):
-            print(f"Animation {anim_name} already recorded. Skipping.")
-            self.recorded_index += 1
-            return task.cont
-
-        anim_name = list(self.animations.keys())[self.recorded_index]
-        animation_limit = math.floor(self.actor.getDuration(anim_name) * self.frame_rate)
-
-        if self.frame_index >= animation_limit:
-            print(f"Animation {anim_name} completed. Total frames: {self.frame_index + 1}")
-            self.images_to_video_moviepy(f"animations/videos/{anim_name}/frames", f"animations/videos/{anim_name}.mp4")
-            # remove the frames after video creation
-            shutil.rmtree(f"animations/videos/{anim_name}/frames")
-
-            self.recorded_index += 1
-            self.frame_index = 0
-            self.warmup_frames = 5
-
-            anim_name = list(self.animations.keys())[self.recorded_index]
-            print(f"Recording animation: {anim_name}")
-            return task.cont
-
-        # advance the animation
-        self.actor.pose(anim_name, frame=self.frame_index)
-
-        os.makedirs(f"animations/videos/{anim_name}/frames", exist_ok=True)  # Create directory if it doesn't exist
-
-        filename = Filename(f"animations/videos/{anim_name}/frames/{self.frame_index}.png")
-        self.win.saveScreenshot(filename)
-        self.frame_index += 1
-
-        img = Image.open(str(filename))
-        img = img.resize((WIDTH, HEIGHT))  # match your window size
-        img.save(str(filename))
-
-        return task.cont
-
-    def images_to_video_moviepy(self, image_dir, output):
+        self.warmup_frames = 5  # Number of frames to warm up the renderer
+
+        # the rendered frames are copied into this texture's RAM image after every frame
+        self.texture = Texture("frame")
+        self.win.addRenderTexture(self.texture, GraphicsOutput.RTMCopyRam)
+        self.frame = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+    def grab_frame(self) -> np.ndarray:
+        """
+        Copies the last rendered frame into the reused RGB frame buffer.
+        Panda3D stores the image bottom up in BGR(A) order, flipping and reordering is done in the same single copy.
+        """
+        height, width = self.texture.getYSize(), self.texture.getXSize()
+        components = self.texture.getNumComponents()
+        image = np.frombuffer(memoryview(self.texture.getRamImage()), dtype=np.uint8)
+        image = image.reshape(height, width, components)
+        np.copyto(self.frame, image[::-1, :, 2::-1])
+        return self.frame
+
+    def record(self, anim_name: str, duration: float, output: str):
+        """
+        Renders an animation and streams its frames into an mp4 file.
+        The video is written to a temporary file first, so an interrupted recording is not mistaken for a finished one.
+        """
+        animation_limit = math.floor(duration * self.frame_rate)
+        anim_frame_rate = self.actor.getFrameRate(anim_name)
+
+        for _ in range(self.warmup_frames):
+            self.actor.pose(anim_name, 0)
+            self.graphicsEngine.renderFrame()
+
+        partial_output = output[:-len(".mp4")] + ".part.mp4"
+        writer = imageio_ffmpeg.write_frames(partial_output, (WIDTH, HEIGHT), fps=self.frame_rate, codec="libx264")
+        writer.send(None)  # start the encoder
         try:
-            files = [
-                f
-                for f in os.listdir(image_dir)
-                if f.endswith(".png")
-            ]
-            files = sorted(files, key=lambda x: int(os.path.splitext(x)[0]))
-            files = [os.path.join(image_dir, f) for f in files]
-            clip = ImageSequenceClip(files, fps=self.frame_rate)
-            clip.write_videofile(output, codec="libx264")
+            for frame_index in range(animation_limit):
+                # advance the animation
+                self.actor.pose(anim_name, frame_index * anim_frame_rate / self.frame_rate)
+                self.graphicsEngine.renderFrame()
+                writer.send(self.grab_frame())
+        finally:
+            writer.close()
+        os.replace(partial_output, output)
+        return animation_limit
+
+
+def render_worker(model_path: str, animations: dict[str, str], durations: dict[str, float], output_folder: str,
+                  frame_rate: int):
+    """Renders a share of the animations in its own process"""
+    converter = Converter(options=animations, model_path=model_path, frame_rate=frame_rate)
+    for anim_name in animations:
+        start = time.perf_counter()
+        try:
+            frames = converter.record(anim_name, durations[anim_name], os.path.join(output_folder, f"{anim_name}.mp4"))
         except Exception as e:
-            print(f"Error creating video: {e}")
-
-if __name__ == "__main__":
-    actor_path = input("Path to actor model (GLB Model Required): ")
-    animations_path = input("Path to animation models (GLB Models Required): ")
+            print(f"Error recording {anim_name}: {e}")
+            continue
+        print(f"Recorded {anim_name}: {frames} frames in {time.perf_counter() - start:.1f}s")
+    converter.destroy()
 
-    animations = load_animations(animations_path=animations_path)
 
-    converter = Converter(options=animations, model_path=actor_path)
-    converter.run()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render GLB animations to MP4 videos")
+    parser.add_argument("actor_path", help="Path to actor model (GLB Model Required)")
+    parser.add_argument("animations_path", help="Path to animation models (GLB Models Required)")
+    parser.add_argument("--output", default="animations/videos", help="Folder the videos are written to")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of parallel render processes")
+    parser.add_argument("--fps", type=int, default=30, help="Frame rate of the videos")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    catalog = AnimationCatalog.load(animations_path=args.animations_path, search_space_path=None)
+
+    todo = {}
+    for anim_name, path in catalog.animations.items():
+        if os.path.exists(os.path.join(args.output, f"{anim_name}.mp4")):
+            print(f"Animation {anim_name} already recorded. Skipping.")
+        else:
+            todo[anim_name] = path
+
+    # every worker gets its own Panda3D instance, spawned to not inherit any state of this process
+    names = list(todo.keys())
+    workers = min(args.workers, len(names))
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker in range(workers):
+        share = {name: todo[name] for name in names[worker::workers]}
+        durations = {name: float(catalog.durations[catalog.ids[name]]) for name in share}
+        process = context.Process(target=render_worker, args=(args.actor_path, share, durations, args.output, args.fps))
+        process.start()
+        processes.append(process)
+
+    start = time.perf_counter()
+    for process in processes:
+        process.join()
+    print(f"Recorded {len(names)} animations with {workers} workers in {time.perf_counter() - start:.1f}s")
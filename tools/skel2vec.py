@@ -0,0 +1,132 @@
+"""
+    Convert GLB animations to searchable vectors by sampling their skeletons directly.
+    Unlike glb2vec.py nothing is rendered and no pose detection is run, the Mixamo joints of each animation are mapped
+    onto the MediaPipe landmarks, so a whole library is converted in seconds.
+    The mapping is calibrated to the vectors glb2vec.py detected on the renders. --check compares the skeleton vectors
+    with these reference vectors and fails if their angle vectors differ by more than the tolerance on average,
+    --calibrate fits the calibration constants of lblm/skeleton.py to them again.
+    :usage:
+    python tools/skel2vec.py <animations folder> <output folder> [--fps 30] [--force]
+    python tools/skel2vec.py <animations folder> --check [--reference lblm/data/search_space] [--tolerance 0.25]
+    python tools/skel2vec.py <animations folder> --calibrate [--reference lblm/data/search_space]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from lblm.body_model import BodyModel
+from lblm.gating import PoseGate
+from lblm.skeleton import extract_vector, load_clip, map_joints
+
+
+def reference_names(input_folder: str, reference_folder: str) -> list[str]:
+    """The animations that have a reference vector"""
+    return sorted(
+        os.path.splitext(filename)[0] for filename in os.listdir(input_folder)
+        if filename.lower().endswith(".glb")
+        and os.path.exists(os.path.join(reference_folder, f"{os.path.splitext(filename)[0]}.npy"))
+    )
+
+
+def angle_error(landmarks: np.ndarray, reference: np.ndarray) -> float:
+    """The mean angular distance in radians between the angle vectors of two landmark vectors"""
+    return PoseGate.distance(BodyModel(data=landmarks).get_angle_vector(), BodyModel(data=reference).get_angle_vector())
+
+
+def check(input_folder: str, reference_folder: str, tolerance: float, fps: float) -> bool:
+    """Compares the skeleton vectors with the reference vectors, :return: If the mean error is within the tolerance."""
+    errors = {}
+    for name in reference_names(input_folder, reference_folder):
+        vector = extract_vector(os.path.join(input_folder, f"{name}.glb"), fps=fps)
+        errors[name] = angle_error(vector, np.load(os.path.join(reference_folder, f"{name}.npy")))
+    if not errors:
+        print(f"No animation in {input_folder} has a reference vector in {reference_folder}")
+        return False
+
+    for name, error in sorted(errors.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {error:.3f}rad {name}")
+    mean = float(np.mean(list(errors.values())))
+    print(f"Mean angle error {mean:.3f}rad over {len(errors)} animations, tolerance {tolerance:.3f}rad")
+    return mean <= tolerance
+
+
+def calibrate(input_folder: str, reference_folder: str, fps: float):
+    """Fits the calibration constants of lblm/skeleton.py to the reference vectors and prints them"""
+    positions, references = [], []
+    for name in reference_names(input_folder, reference_folder):
+        positions.append(np.mean(map_joints(load_clip(os.path.join(input_folder, f"{name}.glb"), fps=fps)), axis=0))
+        reference = np.load(os.path.join(reference_folder, f"{name}.npy")).astype(np.float64)
+        # the reference is averaged over all frames including the ones without a detection, which scales it down
+        references.append(reference / max(float(np.max(reference[:, 3])), 1e-6))
+    positions, references = np.array(positions), np.array(references)
+
+    scale, origin = [], []
+    for axis in (0, 1):
+        world = positions[:, :, axis].ravel()
+        design = np.stack([world, np.ones_like(world)], axis=1)
+        axis_scale, axis_origin = np.linalg.lstsq(design, references[:, :, axis].ravel(), rcond=None)[0]
+        scale.append(axis_scale)
+        origin.append(axis_origin)
+
+    # a common depth scale with an offset per landmark
+    depth, reference_depth = positions[:, :, 2], references[:, :, 2]
+    centered, reference_centered = depth - depth.mean(axis=0), reference_depth - reference_depth.mean(axis=0)
+    depth_scale = np.sum(centered * reference_centered) / np.sum(centered ** 2)
+    landmark_depth = reference_depth.mean(axis=0) - depth_scale * depth.mean(axis=0)
+
+    print(f"FRAME_SCALE = [{scale[0]:.3f}, {scale[1]:.3f}]")
+    print(f"FRAME_ORIGIN = [{origin[0]:.3f}, {origin[1]:.3f}]")
+    print(f"DEPTH_SCALE = {depth_scale:.3f}")
+    print(f"LANDMARK_DEPTH = [{', '.join(f'{value:.3f}' for value in landmark_depth)}]")
+    print(f"LANDMARK_VISIBILITY = [{', '.join(f'{value:.2f}' for value in references[:, :, 3].mean(axis=0))}]")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert GLB animations to search space vectors")
+    parser.add_argument("input_folder", help="Folder containing the .glb animations")
+    parser.add_argument("output_folder", nargs="?", help="Folder the .npy vectors are written to")
+    parser.add_argument("--fps", type=float, default=30, help="Sampling rate of the animations")
+    parser.add_argument("--force", action="store_true", help="Convert animations that already have a vector")
+    parser.add_argument("--check", action="store_true", help="Compare the vectors with the reference vectors")
+    parser.add_argument("--calibrate", action="store_true", help="Fit the calibration to the reference vectors")
+    parser.add_argument("--reference", default="lblm/data/search_space", help="Folder of the detected vectors")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Maximum mean angle error of --check in rad")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.input_folder, args.reference, args.tolerance, args.fps) else 1)
+    if args.calibrate:
+        calibrate(args.input_folder, args.reference, args.fps)
+        sys.exit(0)
+    if not args.output_folder:
+        parser.error("the output folder is required to convert the animations")
+
+    os.makedirs(args.output_folder, exist_ok=True)
+
+    start = time.perf_counter()
+    converted = 0
+    for filename in sorted(os.listdir(args.input_folder)):
+        if not filename.lower().endswith(".glb"):
+            continue
+
+        name = os.path.splitext(filename)[0]
+        output_path = os.path.join(args.output_folder, f"{name}.npy")
+        if os.path.exists(output_path) and not args.force:
+            print(f"Animation {name} already converted. Skipping.")
+            continue
+
+        clip_start = time.perf_counter()
+        try:
+            vector = extract_vector(os.path.join(args.input_folder, filename), fps=args.fps)
+        except Exception as e:
+            print(f"Error converting {name}: {e}")
+            continue
+        np.save(output_path, vector)
+        converted += 1
+        print(f"Converted {name} in {(time.perf_counter() - clip_start) * 1000:.1f}ms")
+
+    print(f"Converted {converted} animations in {time.perf_counter() - start:.2f}s")